@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BasicsearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'basicSearch'
+
+    def ready(self):
+        # Register the search index signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import async_views, views
+
+# basicSearch.urls with the async views, for ASGI (same names, so reverse()
+# works with either)
+urlpatterns = [
+    path("", async_views.index, name="index"),
+    path("search/", async_views.search_restaurants, name="search_restaurants"),
+    path("populate/", views.populate_sample_data, name="populate_sample_data"),
+    path("restaurant/<uuid:restaurant_id>/", async_views.restaurant_detail, name="restaurant_detail"),
+    path("restaurants/", async_views.restaurant_batch, name="restaurant_batch"),
+    path("cache/clear/", async_views.clear_search_cache, name="clear_search_cache"),
+    path("cache/stats/", async_views.get_cache_stats, name="get_cache_stats"),
+]
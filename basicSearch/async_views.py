@@ -0,0 +1,205 @@
+"""
+Async versions of the search, detail and cache views, served under ASGI
+(see mainSearch.asgi_urls). They await the database and the cache instead
+of holding a thread per request, so slow clients only cost a coroutine.
+
+Request parsing, the search pipeline and the response encoding are shared
+with the sync views in views.py.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+
+from . import typeahead
+from .caching import (
+    abump_generation, aget_generation, describe_cache, detail_cache_key, search_cache, search_cache_key,
+)
+from .compression import accepted_encoding, compress_page
+from .conditional import aconditional_response
+from .models import Restaurant, RestaurantTombstone
+from .pagination import InvalidCursor
+from .routers import read_database, reads_search_database
+from .sync import FULL_REINDEX, aget_watermark
+from .views import (
+    _batch_entry, _batch_keys, _batch_response, _batch_rows, _batch_versions, _cached_detail_page, _current_entries,
+    _detail_page, _encode_page, _export_rows, _last_modified_key, _ndjson, _page_response, _parse_batch, _parse_search,
+    _search_page,
+)
+
+
+async def _data_last_modified(generation):
+    """views._data_last_modified() through the async ORM and cache"""
+    key = _last_modified_key(generation)
+    last_modified = await search_cache.aget(key)
+    if last_modified is None:
+        times = [
+            (await Restaurant.objects.aaggregate(time=Max('updated_at')))['time'],
+            (await RestaurantTombstone.objects.aaggregate(time=Max('deleted_at')))['time'],
+            await aget_watermark(FULL_REINDEX),
+        ]
+        # 0 caches "no data" too
+        last_modified = max((time for time in times if time), default=0)
+        await search_cache.aset(key, last_modified, timeout=settings.SEARCH_CACHE_TIMEOUT)
+    return last_modified or None
+
+
+async def _export_results(query, filters, cursor, generation):
+    """views._export_results() reading the rows with aiterator()"""
+    # Building the queryset may query (index sync), applying the cursor may
+    # raise InvalidCursor; both before the response starts
+    rows = await sync_to_async(_export_rows)(query, filters, cursor, generation)
+
+    chunk_size = settings.SEARCH_EXPORT_CHUNK_SIZE
+
+    async def chunks():
+        batch = []
+        async for row in rows.aiterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield _ndjson(batch)
+                batch = []
+        if batch:
+            yield _ndjson(batch)
+
+    return StreamingHttpResponse(chunks(), content_type='application/x-ndjson')
+
+
+async def index(request):
+    """Main search page view"""
+    return render(request, 'basicSearch/index.html')
+
+
+@compress_page
+@reads_search_database
+async def restaurant_detail(request, restaurant_id):
+    """Detailed view for a specific restaurant"""
+    # Only the timestamp is read to validate the client's copy
+    updated_at = await Restaurant.objects.filter(id=restaurant_id).values_list('updated_at', flat=True).afirst()
+    if updated_at is None:
+        raise Http404('No Restaurant matches the given query.')
+
+    async def render_page():
+        key = detail_cache_key(restaurant_id)
+        response = _cached_detail_page(request, await search_cache.aget(key), updated_at)
+        if response is None:
+            try:
+                restaurant = await Restaurant.objects.aget(id=restaurant_id)
+            except Restaurant.DoesNotExist:
+                raise Http404('No Restaurant matches the given query.')
+            entry = _detail_page(restaurant, request)
+            await search_cache.aset(key, entry, timeout=settings.DETAIL_CACHE_TIMEOUT)
+            response = _cached_detail_page(request, entry, entry['updated_at'])
+        return response
+
+    etag = f'{restaurant_id.hex}-{updated_at.timestamp():.6f}'
+    return await aconditional_response(request, 'detail', etag, updated_at, render_page)
+
+
+@reads_search_database
+async def restaurant_batch(request):
+    """API endpoint returning many restaurants by id, cached per restaurant"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    try:
+        ids, fields = _parse_batch(request.GET)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+
+    keys = _batch_keys(ids)
+    versions = {restaurant_id: updated_at async for restaurant_id, updated_at in _batch_versions(ids)}
+    restaurants, stale = _current_entries(keys, await cache.aget_many(keys), versions)
+    if stale:
+        entries = {row['id']: _batch_entry(row) async for row in _batch_rows(stale)}
+        await cache.aset_many(
+            {key: entries[restaurant_id] for key, restaurant_id in keys.items() if restaurant_id in entries},
+            timeout=settings.RESTAURANT_CACHE_TIMEOUT,
+        )
+        restaurants.update((restaurant_id, entry['restaurant']) for restaurant_id, entry in entries.items())
+    return _batch_response(ids, fields, restaurants)
+
+
+@csrf_exempt
+@compress_page
+@reads_search_database
+async def search_restaurants(request):
+    """AJAX API endpoint for restaurant search with caching"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    try:
+        query, cursor, limit, filters, output_format = _parse_search(request.GET)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+
+    # Full result set export, not paginated nor cached
+    if output_format == 'ndjson':
+        try:
+            return await _export_results(query, filters, cursor, await aget_generation())
+        except InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    generation = await aget_generation()
+    cache_key = search_cache_key(
+        generation, 'body', read_database(), query.lower().strip(), filters, limit, cursor,
+    )
+
+    async def render_page():
+        fresh = []
+
+        def compute():
+            variants, body = _encode_page(
+                _search_page(query, filters, limit, cursor, generation), accepted_encoding(request),
+            )
+            fresh.append(body)
+            return variants
+
+        # L1 hits never leave the event loop; a miss runs the search in a thread
+        try:
+            variants, cached = await search_cache.aget_or_compute(
+                cache_key, compute, timeout=settings.SEARCH_CACHE_TIMEOUT,
+            )
+        except InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+        return _page_response(request, variants, None if cached else fresh[0])
+
+    etag = hashlib.sha1(cache_key.encode()).hexdigest()
+    last_modified = await _data_last_modified(generation)
+    return await aconditional_response(request, 'search', etag, last_modified, render_page)
+
+
+async def clear_search_cache(request):
+    """Clear all search cache entries"""
+    try:
+        generation = await abump_generation()
+        return JsonResponse({
+            'success': True,
+            'message': f'Search cache invalidated (generation {generation})',
+            'generation': generation
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Failed to clear cache: {str(e)}'
+        })
+
+
+async def get_cache_stats(request):
+    """Get cache statistics"""
+    try:
+        # Backend entry counts have no async API
+        cache_info = await sync_to_async(describe_cache)()
+        cache_info['typeahead'] = typeahead.stats
+        return JsonResponse({
+            'success': True,
+            'cache_info': cache_info
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Failed to get cache stats: {str(e)}'
+        })
@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import json
+import math
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Generation last read from the shared cache by this process, and when
+_local_generation = (None, 0.0)
+
+
+def _generation_key():
+    return f'{settings.CACHE_KEY_PREFIX}:generation'
+
+
+def _remember_generation(generation):
+    global _local_generation
+    _local_generation = (generation, time.monotonic())
+    return generation
+
+
+def get_generation():
+    """
+    Current search cache generation.
+
+    Every search cache key embeds the generation, so bumping it invalidates
+    all cached searches at once on any cache backend. The counter starts from
+    the current time, so if it is ever evicted the new namespace cannot
+    collide with an older one.
+
+    The value is re-read from the shared cache at most every
+    SEARCH_GENERATION_TTL seconds, so hot searches never leave the process.
+    """
+    generation, read_at = _local_generation
+    if generation is not None and time.monotonic() - read_at < settings.SEARCH_GENERATION_TTL:
+        return generation
+
+    generation = cache.get(_generation_key())
+    if generation is None:
+        cache.add(_generation_key(), time.time_ns() // 1000, timeout=None)
+        generation = cache.get(_generation_key())
+    return _remember_generation(generation)
+
+
+async def aget_generation():
+    """get_generation() through the async cache API"""
+    generation, read_at = _local_generation
+    if generation is not None and time.monotonic() - read_at < settings.SEARCH_GENERATION_TTL:
+        return generation
+
+    generation = await cache.aget(_generation_key())
+    if generation is None:
+        await cache.aadd(_generation_key(), time.time_ns() // 1000, timeout=None)
+        generation = await cache.aget(_generation_key())
+    return _remember_generation(generation)
+
+
+def bump_generation():
+    """Invalidate every cached search result, returns the new generation"""
+    try:
+        generation = cache.incr(_generation_key())
+    except ValueError:
+        # The counter is missing (never set or evicted)
+        cache.add(_generation_key(), time.time_ns() // 1000, timeout=None)
+        generation = cache.incr(_generation_key())
+    return _remember_generation(generation)
+
+
+async def abump_generation():
+    """bump_generation() through the async cache API"""
+    try:
+        generation = await cache.aincr(_generation_key())
+    except ValueError:
+        await cache.aadd(_generation_key(), time.time_ns() // 1000, timeout=None)
+        generation = await cache.aincr(_generation_key())
+    return _remember_generation(generation)
+
+
+def search_cache_key(generation, *parts):
+    """
+    Cache key for a search in the given generation.
+
+    The request parts are hashed, so user input never ends up verbatim in a
+    key (memcached rejects spaces and control characters).
+    """
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return f'{settings.CACHE_KEY_PREFIX}:{generation}:{digest}'
+
+
+def detail_cache_key(restaurant_id):
+    """
+    Cache key of a restaurant's rendered detail page. Not generation based:
+    the entry records the restaurant's updated_at, which a reader compares
+    with the current one, and saves delete it.
+    """
+    return f'{settings.CACHE_KEY_PREFIX}:detail:{restaurant_id.hex}'
+
+
+def restaurant_cache_key(restaurant_id, using):
+    """
+    Cache key of a restaurant's batch lookup entry read from database alias
+    using. Not generation based, so a save elsewhere keeps the other entries:
+    like detail pages, the entry records the restaurant's updated_at, which a
+    reader compares with the current one, and saves and ingests delete it.
+    """
+    return f'{settings.CACHE_KEY_PREFIX}:restaurant:{using}:{restaurant_id.hex}'
+
+
+def forget_restaurants(restaurant_ids):
+    """Delete the batch lookup entries of restaurants, read from any database"""
+    cache.delete_many([
+        restaurant_cache_key(restaurant_id, using)
+        for restaurant_id in restaurant_ids for using in settings.DATABASES
+    ])
+
+
+class LocalCache:
+    """
+    Per-process LRU cache bounded by the pickled size of its values.
+
+    Values are returned as stored, without copying or unpickling, so callers
+    must not mutate them.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()   # key -> (expires, size, value)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, timeout, size=None):
+        if size is None:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        max_size = settings.SEARCH_L1_MAX_BYTES
+        if size > max_size:
+            return
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + timeout, size, value)
+            self.size += size
+            # Evict least recently used entries until the size fits
+            while self.size > max_size:
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SearchCache:
+    """
+    Two-tier cache for search results: a small per-process LocalCache (L1)
+    in front of the configured Django cache (L2).
+
+    Keys embed the search cache generation, so a bump in any process makes
+    both tiers miss and L1 stays coherent with L2.
+
+    get_or_compute() adds stampede protection on top: only the worker holding
+    a per-key lock recomputes an expired entry while the others keep serving
+    the stale value for SEARCH_STALE_GRACE seconds.
+    """
+
+    def __init__(self):
+        self.local = LocalCache()
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = cache.get(key)
+        if value is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value, settings.SEARCH_L1_TIMEOUT)
+        return value
+
+    async def aget(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = await cache.aget(key)
+        if value is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value, settings.SEARCH_L1_TIMEOUT)
+        return value
+
+    def set(self, key, value, timeout):
+        cache.set(key, value, timeout=timeout)
+        self.local.set(key, value, min(timeout, settings.SEARCH_L1_TIMEOUT))
+
+    def delete(self, key):
+        # Other processes' L1 copies live on until they expire; callers
+        # validate what they read (see detail_cache_key)
+        cache.delete(key)
+        self.local.delete(key)
+
+    async def aset(self, key, value, timeout):
+        await cache.aset(key, value, timeout=timeout)
+        self.local.set(key, value, min(timeout, settings.SEARCH_L1_TIMEOUT))
+
+    def get_or_compute(self, key, compute, timeout):
+        """
+        Return (value, cached) for key, calling compute() on a miss.
+
+        Entries stay fresh for timeout seconds and are kept SEARCH_STALE_GRACE
+        seconds longer. Once stale, or earlier with a probability growing
+        as expiry approaches (probabilistic early refresh, scaled by how long
+        compute() took), one worker takes a lock and recomputes while the
+        others return the stale value. With nothing to serve, the others wait
+        up to SEARCH_LOCK_WAIT seconds for the lock holder's result.
+        """
+        entry = self.get(key)
+        if entry is not None and not self._needs_refresh(entry):
+            return entry['value'], True
+
+        if entry is not None:
+            # L1 may hold an entry another process already refreshed in L2
+            shared = cache.get(key)
+            if shared is not None and shared['fresh_until'] > entry['fresh_until']:
+                self.local.set(key, shared, settings.SEARCH_L1_TIMEOUT)
+                return shared['value'], True
+
+        lock_key = f'{key}:lock'
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, timeout=settings.SEARCH_LOCK_TIMEOUT):
+            try:
+                if entry is not None:
+                    self.refreshes += 1
+                return self._compute(key, compute, timeout), False
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if entry is not None:
+            # Another worker is refreshing this entry, serve the stale value meanwhile
+            self.stale_hits += 1
+            return entry['value'], True
+
+        deadline = time.monotonic() + settings.SEARCH_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                self.local.set(key, entry, settings.SEARCH_L1_TIMEOUT)
+                return entry['value'], True
+        # The lock holder is too slow (or died), compute without the lock
+        return self._compute(key, compute, timeout), False
+
+    async def aget_or_compute(self, key, compute, timeout):
+        """
+        get_or_compute() for async views. The cache and the lock go through
+        the async cache API and waiting for another worker sleeps on the
+        event loop; only the sync compute() runs in a worker thread.
+        """
+        entry = await self.aget(key)
+        if entry is not None and not self._needs_refresh(entry):
+            return entry['value'], True
+
+        if entry is not None:
+            shared = await cache.aget(key)
+            if shared is not None and shared['fresh_until'] > entry['fresh_until']:
+                self.local.set(key, shared, settings.SEARCH_L1_TIMEOUT)
+                return shared['value'], True
+
+        lock_key = f'{key}:lock'
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key, token, timeout=settings.SEARCH_LOCK_TIMEOUT):
+            try:
+                if entry is not None:
+                    self.refreshes += 1
+                return await self._acompute(key, compute, timeout), False
+            finally:
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+
+        if entry is not None:
+            self.stale_hits += 1
+            return entry['value'], True
+
+        deadline = time.monotonic() + settings.SEARCH_LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await cache.aget(key)
+            if entry is not None:
+                self.local.set(key, entry, settings.SEARCH_L1_TIMEOUT)
+                return entry['value'], True
+        return await self._acompute(key, compute, timeout), False
+
+    def _compute(self, key, compute, timeout):
+        start = time.monotonic()
+        value = compute()
+        self.set(key, self._entry(value, timeout, start), timeout + settings.SEARCH_STALE_GRACE)
+        return value
+
+    async def _acompute(self, key, compute, timeout):
+        start = time.monotonic()
+        value = await sync_to_async(compute)()
+        await self.aset(key, self._entry(value, timeout, start), timeout + settings.SEARCH_STALE_GRACE)
+        return value
+
+    def _entry(self, value, timeout, start):
+        return {
+            'value': value,
+            'fresh_until': time.time() + timeout,
+            'delta': time.monotonic() - start,
+        }
+
+    def _needs_refresh(self, entry):
+        # XFetch: refresh early when now - delta * beta * ln(U) passes expiry
+        beta = settings.SEARCH_EARLY_REFRESH_BETA
+        jitter = entry['delta'] * beta * -math.log(1.0 - random.random())
+        return time.time() + jitter >= entry['fresh_until']
+
+    def stats(self):
+        return {
+            'l1': {
+                'hits': self.local.hits,
+                'misses': self.local.misses,
+                'entries': len(self.local),
+                'bytes': self.local.size,
+                'max_bytes': settings.SEARCH_L1_MAX_BYTES,
+            },
+            'l2': {
+                'hits': self.shared_hits,
+                'misses': self.shared_misses,
+            },
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+        }
+
+
+# Process-wide search result cache
+search_cache = SearchCache()
+
+
+def cache_entry_count():
+    """Number of entries in the configured cache, when the backend can tell"""
+    backend = caches['default']
+    if hasattr(backend, 'entry_count'):
+        return backend.entry_count()
+    if isinstance(backend, LocMemCache):
+        return len(backend._cache)
+    if isinstance(backend, FileBasedCache):
+        return len(backend._list_cache_files())
+    if hasattr(backend, '_cache') and hasattr(backend._cache, 'get_client'):
+        # Redis: keys of the whole database, which may be shared with other apps
+        return backend._cache.get_client().dbsize()
+    return 'Unknown'
+
+
+def describe_cache():
+    """Description of the configured cache tier for the stats endpoint"""
+    backend = caches['default']
+    config = settings.CACHES['default']
+    location = config.get('LOCATION', '')
+    return {
+        'backend': type(backend).__name__,
+        'location': ', '.join(map(str, location)) if isinstance(location, (list, tuple)) else str(location),
+        'shared': not isinstance(backend, LocMemCache),
+        'timeout': config.get('TIMEOUT', 300),
+        'max_entries': config.get('OPTIONS', {}).get('MAX_ENTRIES', 'Unlimited'),
+        'current_entries': cache_entry_count(),
+        'generation': get_generation(),
+        # Hit/miss counters are per process
+        **search_cache.stats(),
+    }
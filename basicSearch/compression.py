@@ -0,0 +1,175 @@
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+
+# Bodies smaller than this are not worth the encoding headers
+MIN_COMPRESS_SIZE = 200
+
+ACCEPT_ENCODING_RE = re.compile(r'([a-z*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+def available_encodings():
+    """Content codings this process can produce, preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encoding(request):
+    """Preferred content coding accepted by the client, or None for identity"""
+    accepted = {}
+    for coding, quality in ACCEPT_ENCODING_RE.findall(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        try:
+            accepted[coding.lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    """data compressed with a content coding returned by accepted_encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # zlib writes the gzip header without a timestamp, so the output is deterministic
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_tails(head, tails, encoding):
+    """
+    [compress(head + tail, encoding) for tail in tails], compressing the
+    shared head only once with gzip (brotli compressors cannot be copied)
+    """
+    if encoding == 'br':
+        return [compress(head + tail, encoding) for tail in tails]
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    compressed_head = compressor.compress(head)
+    bodies = []
+    for tail in tails:
+        branch = compressor.copy()
+        bodies.append(compressed_head + branch.compress(tail) + branch.flush())
+    return bodies
+
+
+def encoded_variants(data):
+    """
+    data in every available content coding, keyed by Content-Encoding (None
+    for identity). Small bodies are only kept as identity.
+    """
+    variants = {None: data}
+    if len(data) >= MIN_COMPRESS_SIZE:
+        for encoding in available_encodings():
+            variants[encoding] = compress(data, encoding)
+    return variants
+
+
+class StreamCompressor:
+    """Incremental compressor; every compressed chunk can be decoded on arrival"""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+            self._flush = self._compressor.flush
+            self._finish = self._compressor.finish
+            self._compress = self._compressor.process
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+            self._compress = self._compressor.compress
+
+    def compress(self, chunk):
+        return self._compress(chunk) + self._flush()
+
+    def finish(self):
+        return self._finish()
+
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def set_content_encoding(response, encoding):
+    """Mark response as compressed with encoding (None for identity)"""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if encoding is None:
+        return
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity representation, so a
+    # strong validator no longer describes them
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli (when installed) or gzip, whichever the
+    client accepts, like django.middleware.gzip.GZipMiddleware.
+
+    Responses that already have a Content-Encoding, such as the precompressed
+    search pages, are passed through untouched.
+
+    The output is deterministic, so this is only applied to views whose
+    responses hold no secrets (through compress_page), never site-wide:
+    pages with CSRF tokens are left to GZipMiddleware, which pads its output
+    against BREACH.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < MIN_COMPRESS_SIZE:
+            return response
+
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            # The compressed length is unknown until the end
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+        set_content_encoding(response, encoding)
+        return response
+
+
+# View decorator compressing the responses of a (sync or async) view with
+# CompressionMiddleware, like django.views.decorators.gzip.gzip_page
+compress_page = decorator_from_middleware(CompressionMiddleware)
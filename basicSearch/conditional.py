@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_response(request, endpoint, etag, last_modified, render):
+    """
+    Answer a GET with 304 Not Modified when the client's If-None-Match /
+    If-Modified-Since validators are current, without calling render();
+    otherwise with render()'s response.
+
+    etag is an unquoted entity tag, sent weak: the body may be compressed,
+    and a 304 cannot tell whether the 200 would have been. last_modified is
+    an aware datetime or None. Successful and 304 responses
+    carry both validators and the HTTP_CACHE_CONTROL directives configured
+    for endpoint.
+    """
+    etag, timestamp = 'W/' + quote_etag(etag), _timestamp(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    return _add_validators(response, endpoint, etag, timestamp)
+
+
+async def aconditional_response(request, endpoint, etag, last_modified, render):
+    """conditional_response() for async views, render being a coroutine function"""
+    etag, timestamp = 'W/' + quote_etag(etag), _timestamp(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await render()
+    return _add_validators(response, endpoint, etag, timestamp)
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def _add_validators(response, endpoint, etag, timestamp):
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        if timestamp is not None:
+            response.headers['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, **settings.HTTP_CACHE_CONTROL.get(endpoint, {}))
+    return response
@@ -0,0 +1,15 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, several times faster than the json module
+    orjson = None
+
+
+def dumps(data):
+    """Encode data as compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, default=DjangoJSONEncoder().default)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
@@ -0,0 +1,145 @@
+import math
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision of the stored geohash column (~4 cm cells)
+GEOHASH_PRECISION = 12
+
+# Finest precision tried by nearest_radius (~150 m cells)
+NEAREST_START_PRECISION = 7
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point, precision characters long"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude (even) and latitude (odd)
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude, longitude) size in degrees of a geohash cell"""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covered_radius(latitude, precision):
+    """
+    Radius in km certainly covered by the 3x3 block of cells around a point.
+
+    The point lies in the middle cell, so the block reaches at least one full
+    cell beyond it in every direction.
+    """
+    lat_size, lng_size = cell_size(precision)
+    # Longitude degrees shrink towards the poles; use the widest latitude of the block
+    widest = min(90.0, abs(latitude) + 2 * lat_size)
+    return min(lat_size * KM_PER_DEGREE, lng_size * KM_PER_DEGREE * math.cos(math.radians(widest)))
+
+
+def precision_for_radius(latitude, radius_km):
+    """Finest precision whose 3x3 cell block covers radius_km, 0 if none does"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if covered_radius(latitude, precision) >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(latitude, longitude, precision):
+    """Geohashes of the cell containing a point and of its 8 neighbours"""
+    lat_size, lng_size = cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        lat = min(90.0, max(-90.0, latitude + lat_step * lat_size))
+        for lng_step in (-1, 0, 1):
+            lng = (longitude + lng_step * lng_size + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lng, precision))
+    return cells
+
+
+def cells_filter(cells):
+    """
+    Match geohashes starting with any of the cells.
+
+    Written as ranges rather than startswith, so SQLite can use the B-tree
+    index on the column; '{' sorts right after 'z', the last geohash letter.
+    """
+    condition = Q()
+    for cell in sorted(cells):
+        condition |= Q(geohash__gte=cell, geohash__lt=cell + '{')
+    return condition
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from a point, evaluated by the database"""
+    lat = Radians(Cast('latitude', FloatField()))
+    lng = Radians(Cast('longitude', FloatField()))
+    lat0 = math.radians(latitude)
+    lng0 = math.radians(longitude)
+    half_chord = (
+        Power(Sin((lat - Value(lat0)) / 2), 2) +
+        Value(math.cos(lat0)) * Cos(lat) * Power(Sin((lng - Value(lng0)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(half_chord), output_field=FloatField())
+
+
+def annotate_distance(queryset, latitude, longitude):
+    """Annotate restaurants with a located position with their distance in km"""
+    return queryset.filter(geohash__gt='').annotate(distance=distance_expression(latitude, longitude))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Restrict a queryset annotated by annotate_distance to radius_km.
+
+    The geohash ranges select the candidate rows through the index, the exact
+    distance is only computed for those.
+    """
+    precision = precision_for_radius(latitude, radius_km)
+    if precision:
+        queryset = queryset.filter(cells_filter(covering_cells(latitude, longitude, precision)))
+    return queryset.filter(distance__lte=radius_km)
+
+
+def nearest_radius(queryset, latitude, longitude, count):
+    """
+    Smallest radius (among the geohash cell sizes) holding at least count
+    rows of queryset, or None when even the coarsest cells hold fewer.
+
+    Starts from ~150 m cells and widens; each step is a LIMITed COUNT over an
+    index range.
+    """
+    for precision in range(NEAREST_START_PRECISION, 0, -1):
+        radius = covered_radius(latitude, precision)
+        found = within_radius(queryset, latitude, longitude, radius)[:count].count()
+        if found >= count:
+            return radius
+    return None
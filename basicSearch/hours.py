@@ -0,0 +1,79 @@
+import re
+
+
+# Keys of Restaurant.operating_hours, in datetime.weekday() order
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+MINUTES_PER_DAY = 24 * 60
+
+TIME_RE = re.compile(r'^(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?$', re.IGNORECASE)
+RANGE_SEPARATOR_RE = re.compile(r'\s*(?:-|–|—|\bto\b)\s*', re.IGNORECASE)
+
+
+def parse_time(text):
+    """Minutes after midnight of a time like "5:00 PM", "17:30" or "noon"; None if unreadable"""
+    text = text.strip().lower()
+    if text == 'noon':
+        return 12 * 60
+    if text == 'midnight':
+        return 0
+    match = TIME_RE.match(text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.startswith('p') else 0)
+    if hour > 24 or minute > 59 or (hour == 24 and minute):
+        return None
+    return hour * 60 + minute
+
+
+def parse_hours(text):
+    """
+    (open_minute, close_minute) pairs of a day's hours string such as
+    "11:00 AM - 2:00 PM, 5:00 PM - 12:00 AM". A close at or before the open
+    time is on the next day. "Closed" and unreadable ranges give no pairs.
+    """
+    if not isinstance(text, str):
+        return []
+    if text.strip().lower() in ('open 24 hours', '24 hours', '24/7'):
+        return [(0, MINUTES_PER_DAY)]
+
+    ranges = []
+    for part in re.split(r'[,;]', text):
+        times = RANGE_SEPARATOR_RE.split(part.strip())
+        if len(times) != 2:
+            continue
+        open_minute, close_minute = parse_time(times[0]), parse_time(times[1])
+        if open_minute is None or close_minute is None:
+            continue
+        ranges.append((open_minute, close_minute))
+    return ranges
+
+
+def opening_intervals(operating_hours):
+    """
+    Normalize operating hours into (day, open_minute, close_minute) intervals,
+    day being a DAYS index and close_minute exclusive.
+
+    Ranges closing past midnight are split at midnight, so each interval lies
+    within one day: friday "5:00 PM - 2:00 AM" gives (4, 1020, 1440) and
+    (5, 0, 120).
+    """
+    intervals = []
+    for day, name in enumerate(DAYS):
+        for open_minute, close_minute in parse_hours((operating_hours or {}).get(name)):
+            if close_minute > open_minute:
+                intervals.append((day, open_minute, close_minute))
+                continue
+            intervals.append((day, open_minute, MINUTES_PER_DAY))
+            if close_minute:
+                intervals.append(((day + 1) % 7, 0, close_minute))
+    return intervals
+
+
+def week_position(moment):
+    """(day, minute) of a local datetime, as used by opening_intervals"""
+    return moment.weekday(), moment.hour * 60 + moment.minute
@@ -0,0 +1,77 @@
+import random
+import time
+
+from basicSearch.hours import opening_intervals
+from basicSearch.models import OpeningInterval, Restaurant
+
+
+WORDS = [
+    'pizza', 'sushi', 'garden', 'palace', 'ocean', 'luna', 'grill', 'bistro',
+    'taco', 'noodle', 'house', 'kitchen', 'corner', 'golden', 'river', 'harbor',
+    'spice', 'olive', 'maple', 'smoke', 'blue', 'red', 'green', 'express',
+]
+CUISINES = ['Italian', 'Japanese', 'American', 'Seafood', 'French Bistro', 'Mexican', 'Thai', 'Indian']
+NEIGHBOURHOODS = ['Downtown', 'Midtown', 'Riverside', 'Waterfront', 'Arts District', 'Historic Quarter']
+HOURS = {
+    'monday': '11:00 AM - 10:00 PM',
+    'tuesday': '11:00 AM - 10:00 PM',
+    'wednesday': '11:00 AM - 10:00 PM',
+    'thursday': '11:00 AM - 10:00 PM',
+    'friday': '5:00 PM - 12:00 AM',
+    'saturday': '5:00 PM - 2:00 AM',
+    'sunday': '12:00 PM - 9:00 PM',
+}
+
+
+def create_restaurants(count, seed=0, batch_size=2000, using='default'):
+    """Insert count synthetic restaurants shaped like the sample data into database using"""
+    rng = random.Random(seed)
+    vibes = [choice for choice, label in Restaurant.VIBES_CHOICES]
+    batch = []
+    for i in range(count):
+        slug = rng.choice(WORDS)
+        restaurant = Restaurant(
+            name=' '.join(rng.sample(WORDS, 2)).title(),
+            cuisine=rng.choice(CUISINES),
+            address=f'{rng.randint(1, 999)} {rng.choice(WORDS).title()} St, City',
+            neighbourhood=rng.choice(NEIGHBOURHOODS),
+            latitude=round(rng.uniform(40.6, 40.9), 6),
+            longitude=round(rng.uniform(-74.1, -73.8), 6),
+            rating=round(rng.uniform(3, 5), 1),
+            price_range=rng.choice(['$', '$$', '$$$', '$$$$']),
+            reservation_partner=rng.choice(['OpenTable', 'SevenRooms', 'Tock', 'None']),
+            website=f'https://{slug}.example.com',
+            instagram_url=f'https://instagram.com/{slug}',
+            operating_hours=HOURS,
+            vibes=rng.sample(vibes, 4),
+            images=[f'https://images.example.com/{slug}/{n}.jpg?w=800' for n in range(10)],
+        )
+        # bulk_create skips save(), fill the denormalized search columns here
+        # (and the opening intervals in _insert)
+        restaurant.refresh_search_fields()
+        batch.append(restaurant)
+        if len(batch) == batch_size:
+            _insert(batch, using)
+            batch = []
+    _insert(batch, using)
+
+
+def _insert(restaurants, using):
+    Restaurant.objects.using(using).bulk_create(restaurants)
+    OpeningInterval.objects.using(using).bulk_create(
+        OpeningInterval(restaurant=restaurant, day=day, open_minute=open_minute, close_minute=close_minute)
+        for restaurant in restaurants
+        for day, open_minute, close_minute in opening_intervals(restaurant.operating_hours)
+    )
+
+
+def best_of(func, repeat):
+    """Best wall clock time of repeat calls to func, and its last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
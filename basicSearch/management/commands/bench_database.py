@@ -0,0 +1,205 @@
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from basicSearch.models import Restaurant
+from basicSearch.search import DEFAULT_ORDERING, filter_attributes, project_results, vibe_facets
+from basicSearch.transactions import write_transaction
+
+from ._benchmark import best_of, create_restaurants
+
+
+PROFILES = ('default', 'production')
+
+
+def search_queries(alias):
+    """Read paths of the search API, as callables against database alias"""
+    restaurants = Restaurant.objects.using(alias)
+    return {
+        # No row matches, so every search_document is read
+        'full scan': lambda: list(
+            project_results(restaurants.filter(search_document__contains='qqq')).order_by(*DEFAULT_ORDERING)[:20]
+        ),
+        'filtered page': lambda: list(
+            project_results(filter_attributes(restaurants, {'price_range': ['$$'], 'min_rating': 4.0}))
+            .order_by(*DEFAULT_ORDERING)[:20]
+        ),
+        'vibe facets': lambda: vibe_facets(restaurants),
+    }
+
+
+def register_database(alias, path, profile):
+    """Add a database alias for the SQLite file at path, configured as profile"""
+    databases = connections.configure_settings({
+        'default': settings.DATABASES['default'],
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, **settings.DATABASE_PROFILES[profile]},
+    })
+    connections.settings[alias] = databases[alias]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the default and production SQLite profiles (DATABASE_PROFILES) '
+        'on a copy of the database: connection reuse, search reads, and reads '
+        'while a writer is busy'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000,
+                            help='Synthetic restaurants added to the copy')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Simulated requests for the connection test')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Reader threads in the concurrency test')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Seconds of the concurrency test')
+        parser.add_argument('--write-batch', type=int, default=1000,
+                            help='Rows rewritten per write transaction in the concurrency test')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per search query')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('bench_database compares SQLite profiles')
+
+        with tempfile.TemporaryDirectory() as directory:
+            base = Path(directory) / 'base.sqlite3'
+            self.stdout.write(f'Copying the database and adding {options["rows"]} restaurants...')
+            self._prepare(base, options['rows'])
+
+            results = {}
+            for profile in PROFILES:
+                path = Path(directory) / f'{profile}.sqlite3'
+                shutil.copyfile(base, path)
+                alias = f'bench_{profile}'
+                register_database(alias, path, profile)
+                try:
+                    results[profile] = self._run(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+        self._report(results, options)
+
+    def _prepare(self, path, rows):
+        # The backup API copies a consistent snapshot of the live database
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        # Start both profiles from a rollback journal file; 'production' switches to WAL
+        target.execute('PRAGMA journal_mode=DELETE')
+        target.close()
+
+        register_database('bench_prepare', path, 'default')
+        try:
+            with transaction.atomic(using='bench_prepare'):
+                create_restaurants(rows, seed=rows, using='bench_prepare')
+        finally:
+            connections['bench_prepare'].close()
+            del connections.settings['bench_prepare']
+
+    def _run(self, alias, options):
+        connection = connections[alias]
+        result = {}
+
+        # A detail page validation per request; without CONN_MAX_AGE Django
+        # closes the connection at the end of every request
+        ids = list(Restaurant.objects.using(alias).values_list('pk', flat=True)[:100])
+        start = time.perf_counter()
+        for number in range(options['requests']):
+            Restaurant.objects.using(alias).filter(pk=ids[number % len(ids)]).values_list('updated_at').first()
+            connection.close_if_unusable_or_obsolete()
+        result['request'] = (time.perf_counter() - start) / options['requests']
+
+        result['queries'] = {
+            name: best_of(query, options['repeat'])[0] for name, query in search_queries(alias).items()
+        }
+        result['concurrent'] = self._concurrent(alias, options)
+        return result
+
+    def _concurrent(self, alias, options):
+        """Readers timing search reads while a writer runs ingest-sized transactions"""
+        stop = threading.Event()
+        latencies = []
+        errors = []
+        writes = []
+
+        def reader():
+            queries = list(search_queries(alias).values())[:2]
+            number = 0
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        queries[number % len(queries)]()
+                        latencies.append(time.perf_counter() - start)
+                    except OperationalError:
+                        errors.append(time.perf_counter() - start)
+                    number += 1
+            finally:
+                connections[alias].close()
+
+        def writer():
+            batch = Restaurant.objects.using(alias).values('pk')[:options['write_batch']]
+            step = 0
+            try:
+                while not stop.is_set():
+                    # Rewrite a batch of rows, like one ingest_restaurants batch
+                    with write_transaction(using=alias):
+                        Restaurant.objects.using(alias).filter(pk__in=batch).update(phone=f'555-{step:04d}')
+                    writes.append(step)
+                    step += 1
+            except OperationalError:
+                errors.append(0)
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        return {
+            'reads': len(latencies) / options['duration'],
+            'p50': statistics.median(latencies) if latencies else 0.0,
+            'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+            'errors': len(errors),
+            'writes': len(writes) / options['duration'],
+        }
+
+    def _report(self, results, options):
+        default, production = results['default'], results['production']
+
+        def row(name, before, after, unit='ms', scale=1000):
+            speedup = before / after if after else float('inf')
+            self.stdout.write(f'{name:<26}{before * scale:>12.3f}{after * scale:>12.3f}{speedup:>9.1f}x  {unit}')
+
+        self.stdout.write(f'\n{"":<26}{"default":>12}{"production":>12}{"gain":>10}')
+        row('request (pk lookup)', default['request'], production['request'], 'us', 1e6)
+        for name in default['queries']:
+            row(name, default['queries'][name], production['queries'][name])
+
+        self.stdout.write(
+            f'\nReads with a concurrent writer ({options["readers"]} readers, {options["duration"]:g}s)'
+        )
+        self.stdout.write(f'{"profile":<14}{"reads/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}{"writes/s":>10}')
+        for profile in PROFILES:
+            stats = results[profile]['concurrent']
+            self.stdout.write(
+                f'{profile:<14}{stats["reads"]:>10.0f}{stats["p50"] * 1000:>10.2f}'
+                f'{stats["p99"] * 1000:>10.2f}{stats["errors"]:>8}{stats["writes"]:>10.1f}'
+            )
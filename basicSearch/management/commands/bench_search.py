@@ -0,0 +1,76 @@
+import time
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from basicSearch.models import Restaurant
+from basicSearch.search import filter_restaurants
+from basicSearch.search_index import search_index
+
+from ._benchmark import best_of, create_restaurants
+
+
+QUERIES = ['pizza', 'sushi palace', 'riverside', 'gold', 'thai', 'maple dr', 'zzz']
+
+# The filters search_restaurants used before the search backends existed
+ICONTAINS_FIELDS = ('name', 'cuisine', 'address', 'neighbourhood')
+
+
+def icontains_filter(query):
+    return reduce(or_, (Q(**{f'{field}__icontains': query}) for field in ICONTAINS_FIELDS))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the search backends against the original icontains filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                            help='Table sizes to benchmark')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per query')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves synthetic rows in the database
+        with transaction.atomic():
+            created = 0
+            for rows in sorted(options['rows']):
+                create_restaurants(rows - created, seed=rows)
+                created = rows
+                self._run(rows, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _time(self, backend, query, repeat):
+        def search():
+            if backend == 'icontains':
+                queryset = Restaurant.objects.filter(icontains_filter(query))
+            else:
+                queryset = filter_restaurants(Restaurant.objects.all(), query)
+            return list(queryset.values_list('pk', flat=True))
+
+        with override_settings(SEARCH_BACKEND=backend):
+            best, ids = best_of(search, repeat)
+        return best, len(ids)
+
+    def _run(self, rows, repeat):
+        start = time.perf_counter()
+        search_index.build()
+        build_time = time.perf_counter() - start
+
+        self.stdout.write(f'\n{rows} restaurants (index build {build_time * 1000:.0f} ms)')
+        self.stdout.write(
+            f'{"query":<16}{"matches":>10}{"icontains ms":>14}{"orm ms":>12}{"index ms":>12}{"fts ms":>12}'
+        )
+        for query in QUERIES:
+            icontains_time, icontains_count = self._time('icontains', query, repeat)
+            orm_time, orm_count = self._time('orm', query, repeat)
+            index_time, index_count = self._time('index', query, repeat)
+            fts_time, fts_count = self._time('fts', query, repeat)
+            self.stdout.write(
+                f'{query:<16}{index_count:>10}{icontains_time * 1000:>14.2f}{orm_time * 1000:>12.2f}'
+                f'{index_time * 1000:>12.2f}{fts_time * 1000:>12.2f}'
+            )
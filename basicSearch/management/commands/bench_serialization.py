@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from basicSearch.models import Restaurant
+from basicSearch.search import project_results, serialize_result
+
+from ._benchmark import best_of, create_restaurants
+
+
+def serialize_instances(queryset):
+    """Previous serialization path: full model instances"""
+    results = []
+    for restaurant in queryset:
+        results.append({
+            'id': str(restaurant.id),
+            'name': restaurant.name,
+            'cuisine': restaurant.cuisine or '',
+            'address': restaurant.address,
+            'neighbourhood': restaurant.neighbourhood or '',
+            'rating': float(restaurant.rating) if restaurant.rating else 0.0,
+            'price_range': restaurant.price_range or '',
+            'vibes': [vibe.lower() for vibe in restaurant.get_vibes_display()[:3]],
+            'reservation_partner': restaurant.reservation_partner,
+            'main_image': restaurant.images[0] if restaurant.images else None,
+        })
+    return results
+
+
+def serialize_rows(queryset):
+    """Lean serialization path used by the search view"""
+    return [serialize_result(row) for row in project_results(queryset)]
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the per-row cost of search result serialization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000,
+                            help='Rows to serialize')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per path')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            create_restaurants(rows)
+            # A fresh queryset per run, so no run reuses a cached result list
+            instance_time, before = best_of(lambda: serialize_instances(Restaurant.objects.all()), options['repeat'])
+            row_time, after = best_of(lambda: serialize_rows(Restaurant.objects.all()), options['repeat'])
+            transaction.set_rollback(True)
+
+        if before != after:
+            self.stderr.write('Serialized results differ between the two paths')
+
+        self.stdout.write(f'{rows} rows, best of {options["repeat"]}')
+        self.stdout.write(f'{"path":<12}{"total ms":>12}{"us / row":>12}')
+        for name, elapsed in (('instances', instance_time), ('values', row_time)):
+            self.stdout.write(f'{name:<12}{elapsed * 1000:>12.1f}{elapsed / rows * 1e6:>12.2f}')
+        self.stdout.write(f'speedup {instance_time / row_time:.1f}x')
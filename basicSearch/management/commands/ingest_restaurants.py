@@ -0,0 +1,241 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from basicSearch.caching import bump_generation, forget_restaurants
+from basicSearch.hours import opening_intervals
+from basicSearch.models import OpeningInterval, Restaurant
+from basicSearch.search import FTS_TABLE
+from basicSearch.sync import get_watermark, purge_tombstones, set_watermark
+from basicSearch.transactions import write_transaction
+
+from .rebuild_search_fields import SEARCH_FIELDS
+
+
+# Fields a record may set; the primary key, timestamps and the denormalized
+# search columns are maintained by the command
+INGEST_FIELDS = {
+    field.name: field for field in Restaurant._meta.concrete_fields
+    if field.editable and not field.primary_key
+}
+
+# Columns overwritten when a place_id already exists. Records are merged
+# into the stored row first (see Command._merge), so fields a record leaves
+# out keep their value.
+UPDATE_FIELDS = [name for name in INGEST_FIELDS if name != 'place_id'] + SEARCH_FIELDS + ['updated_at']
+
+# Fields holding JSON in CSV files; lists may also be written as a|b|c
+JSON_FIELDS = {'operating_hours', 'vibes', 'images'}
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as lines:
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                yield number, json.loads(line)
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as rows:
+        # Line 1 is the header
+        for number, row in enumerate(csv.DictReader(rows), 2):
+            for name in JSON_FIELDS & row.keys():
+                value = (row[name] or '').strip()
+                if value.startswith(('[', '{')):
+                    row[name] = json.loads(value)
+                elif name != 'operating_hours':
+                    row[name] = [item.strip() for item in value.split('|') if item.strip()]
+            yield number, row
+
+
+READERS = {'.jsonl': read_jsonl, '.ndjson': read_jsonl, '.csv': read_csv}
+
+
+def record_updated_at(record):
+    """Aware datetime of a record's optional updated_at"""
+    value = record.get('updated_at')
+    if not value:
+        return None
+    updated_at = parse_datetime(str(value))
+    if updated_at is None:
+        raise ValidationError('updated_at: not a datetime')
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at)
+    return updated_at
+
+
+def is_deleted(record):
+    return str(record.get('deleted', '')).lower() in ('1', 'true')
+
+
+def clean_record(record):
+    """Validated field values of a record, only for the fields it carries"""
+    values = {}
+    for name, value in record.items():
+        field = INGEST_FIELDS.get(name)
+        if field is None:
+            continue
+        # Empty CSV cells of non-text fields mean "not set"
+        if value == '' and not isinstance(field, (models.CharField, models.TextField)):
+            value = None if field.null else field.get_default()
+        try:
+            # Feeds carry more digits than we store (coordinates), round rather than reject
+            if isinstance(field, models.DecimalField) and value is not None:
+                value = round(Decimal(str(value)), field.decimal_places)
+            values[name] = field.clean(value, None)
+        except InvalidOperation:
+            raise ValidationError(f'{name}: not a number')
+        except ValidationError as error:
+            raise ValidationError(f'{name}: {" ".join(error.messages)}')
+
+    if not values.get('place_id'):
+        raise ValidationError('place_id is required')
+    return values
+
+
+class Command(BaseCommand):
+    help = 'Upsert (or delete) restaurants by place_id from JSONL or CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='.jsonl/.ndjson or .csv files, one restaurant per line')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Restaurants written per transaction')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Skip records whose updated_at is older than the newest one of '
+                                 'the last incremental run of a file with the same name')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        for path in options['paths']:
+            if Path(path).suffix.lower() not in READERS:
+                raise CommandError(f'Unsupported file type: {path}')
+
+        start = time.perf_counter()
+        ingested = skipped = unchanged = 0
+        for path in options['paths']:
+            reader = READERS[Path(path).suffix.lower()]
+            # High-water mark of the records' updated_at, per feed file name
+            watermark_name = f'ingest:{Path(path).name}'
+            watermark = get_watermark(watermark_name) if options['incremental'] else None
+            newest = watermark
+            batch = {}
+            for number, record in reader(path):
+                try:
+                    updated_at = record_updated_at(record)
+                    # Records at the watermark itself are applied again: a
+                    # later export can hold more of them, and upserts are idempotent
+                    if watermark and updated_at and updated_at < watermark:
+                        unchanged += 1
+                        continue
+                    if is_deleted(record):
+                        if not record.get('place_id'):
+                            raise ValidationError('place_id is required')
+                        place_id, values = str(record['place_id']), None
+                    else:
+                        values = clean_record(record)
+                        place_id = values['place_id']
+                except ValidationError as error:
+                    skipped += 1
+                    self.stderr.write(f'{path}:{number}: skipped, {" ".join(error.messages)}')
+                    continue
+                if updated_at and (newest is None or updated_at > newest):
+                    newest = updated_at
+                # The last record of a place wins, also within a batch;
+                # None marks a delete
+                batch[place_id] = values
+                if len(batch) >= options['batch_size']:
+                    ingested += self._write(batch)
+                    batch = {}
+                    self.stdout.write(f'Ingested {ingested} restaurants', ending='\r')
+            ingested += self._write(batch)
+            if options['incremental'] and newest != watermark:
+                set_watermark(watermark_name, newest)
+
+        # No signals were sent per upserted row; invalidate the search cache
+        # once. In-memory indexes pick the rows up by their updated_at.
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}") VALUES (\'optimize\')')
+        purge_tombstones()
+        bump_generation()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Ingested {ingested} restaurants ({skipped} skipped, {unchanged} unchanged) in {elapsed:.1f}s'
+        ))
+
+    def _write(self, batch):
+        """Apply one batch (place_id -> cleaned record values, or None to delete)"""
+        records = [values for values in batch.values() if values is not None]
+        deleted = [place_id for place_id, values in batch.items() if values is None]
+        # The stored rows are read and written in one transaction, so no
+        # other write can land in between; it takes the write lock up front
+        with write_transaction():
+            if deleted:
+                # Deletes are rare; the signals record tombstones for them
+                Restaurant.objects.filter(place_id__in=self._in_list(deleted)).delete()
+            if records:
+                restaurants = self._merge(records)
+                self._upsert(restaurants)
+        if records:
+            # Bulk upserts send no signals; the entries would fail validation
+            # against the new updated_at anyway, but need not wait for it
+            forget_restaurants(restaurant.pk for restaurant in restaurants)
+        return len(batch)
+
+    def _merge(self, records):
+        """
+        Restaurants for records, with their search columns filled in: a known
+        place's stored row updated with the fields its record carries, or a
+        new Restaurant
+        """
+        stored = Restaurant.objects.filter(place_id__in=self._in_list(values['place_id'] for values in records))
+        places = {restaurant.place_id: restaurant for restaurant in stored}
+        restaurants = []
+        for values in records:
+            restaurant = places.get(values['place_id'])
+            if restaurant is None:
+                restaurant = Restaurant(**values)
+            else:
+                for name, value in values.items():
+                    setattr(restaurant, name, value)
+            restaurant.refresh_search_fields()
+            restaurants.append(restaurant)
+        return restaurants
+
+    def _upsert(self, restaurants):
+        """Upsert restaurants and replace their opening intervals"""
+        Restaurant.objects.bulk_create(
+            restaurants,
+            update_conflicts=True,
+            unique_fields=['place_id'],
+            update_fields=UPDATE_FIELDS,
+        )
+        # Known places were read with their id, new ones got a fresh one
+        ids = self._in_list(restaurant.pk.hex for restaurant in restaurants)
+        OpeningInterval.objects.filter(restaurant_id__in=ids).delete()
+        OpeningInterval.objects.bulk_create(
+            OpeningInterval(
+                restaurant_id=restaurant.pk,
+                day=day, open_minute=open_minute, close_minute=close_minute,
+            )
+            for restaurant in restaurants
+            for day, open_minute, close_minute in opening_intervals(restaurant.operating_hours)
+        )
+
+    def _in_list(self, values):
+        values = list(values)
+        if connection.vendor == 'sqlite':
+            # A single JSON parameter, whatever the batch size
+            return RawSQL('SELECT value FROM json_each(%s)', [json.dumps(values)])
+        return values
@@ -0,0 +1,149 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = [
+    '/search/?q=pizza',
+    '/search/?q=',
+    '/search/?q=sushi&price_range=$$',
+]
+
+
+async def read_response(reader, read_rate):
+    """Read one HTTP/1.1 response; returns (status, body bytes, keep alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        size = 0
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            size += len(await read_body(reader, chunk_size + 2, read_rate)) - 2
+            if chunk_size == 0:
+                break
+    else:
+        size = len(await read_body(reader, int(headers.get('content-length', 0)), read_rate))
+    return status, size, headers.get('connection', '').lower() != 'close'
+
+
+async def read_body(reader, length, read_rate):
+    """Read length bytes, no faster than read_rate bytes/s (0: unthrottled)"""
+    if not read_rate:
+        return await reader.readexactly(length)
+    data = b''
+    # A slow client drains the socket a few KB at a time
+    while len(data) < length:
+        part = await reader.readexactly(min(4096, length - len(data)))
+        data += part
+        await asyncio.sleep(len(part) / read_rate)
+    return data
+
+
+async def client(target, paths, deadline, read_rate, accept_encoding, stats):
+    """One keep-alive connection issuing requests back to back until deadline"""
+    url = urlsplit(target)
+    host, port = url.hostname, url.port or 80
+    request_number = 0
+    writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            path = url.path.rstrip('/') + paths[request_number % len(paths)]
+            request_number += 1
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                f'Accept-Encoding: {accept_encoding}\r\nConnection: keep-alive\r\n\r\n'.encode()
+            )
+            start = time.monotonic()
+            await writer.drain()
+            status, size, keep_alive = await read_response(reader, read_rate)
+            stats['latencies'].append(time.monotonic() - start)
+            stats['bytes'] += size
+            if status != 200:
+                stats['errors'] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            stats['errors'] += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            # Do not spin on a refused connection
+            await asyncio.sleep(0.1)
+    if writer is not None:
+        writer.close()
+
+
+async def run(target, paths, concurrency, duration, read_rate, accept_encoding):
+    stats = {'latencies': [], 'bytes': 0, 'errors': 0}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        client(target, paths, deadline, read_rate, accept_encoding, stats)
+        for _ in range(concurrency)
+    ))
+    return stats
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test running servers with many concurrent keep-alive clients, '
+        'e.g. the same project under WSGI (gunicorn) and ASGI (uvicorn)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+',
+                            help='Base URLs of the servers to compare, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Request path, repeatable; defaults to a few searches')
+        parser.add_argument('--concurrency', type=int, default=500,
+                            help='Simultaneous client connections')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds of load per target')
+        parser.add_argument('--read-rate', type=int, default=0,
+                            help='Bytes/s each client reads responses at, to emulate slow '
+                                 'mobile links (0: as fast as possible)')
+        parser.add_argument('--accept-encoding', default='gzip',
+                            help='Accept-Encoding request header')
+
+    def handle(self, *args, **options):
+        for target in options['targets']:
+            if urlsplit(target).scheme != 'http':
+                raise CommandError(f'Only http:// targets are supported: {target}')
+        paths = options['paths'] or DEFAULT_PATHS
+
+        self.stdout.write(
+            f'{options["concurrency"]} clients, {options["duration"]:g}s per target'
+            + (f', reading at {options["read_rate"]} B/s' if options['read_rate'] else '')
+        )
+        self.stdout.write(f'{"target":<32}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"MB/s":>8}{"errors":>8}')
+        for target in options['targets']:
+            stats = asyncio.run(run(
+                target, paths, options['concurrency'], options['duration'],
+                options['read_rate'], options['accept_encoding'],
+            ))
+            latencies = sorted(stats['latencies'])
+            self.stdout.write(
+                f'{target:<32}{len(latencies) / options["duration"]:>10.0f}'
+                f'{statistics.median(latencies) * 1000 if latencies else 0:>10.1f}'
+                f'{percentile(latencies, 0.99) * 1000:>10.1f}'
+                f'{stats["bytes"] / options["duration"] / 1e6:>8.2f}{stats["errors"]:>8}'
+            )
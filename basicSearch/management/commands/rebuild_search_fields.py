@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from basicSearch.caching import bump_generation
+from basicSearch.hours import opening_intervals
+from basicSearch.models import OpeningInterval, Restaurant
+from basicSearch.sync import request_full_reindex
+
+
+# Columns the denormalized search fields are computed from
+SOURCE_FIELDS = ('name', 'cuisine', 'address', 'neighbourhood', 'vibes', 'latitude', 'longitude', 'operating_hours')
+
+# Denormalized columns maintained by Restaurant.refresh_search_fields()
+SEARCH_FIELDS = ['search_document', 'geohash', 'vibes_mask']
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized search columns and opening intervals of every restaurant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Restaurants updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Restaurant.objects.only('pk', *SOURCE_FIELDS).order_by('pk')
+
+        updated = 0
+        last_pk = None
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+
+            intervals = []
+            for restaurant in batch:
+                restaurant.refresh_search_fields()
+                intervals.extend(
+                    OpeningInterval(restaurant=restaurant, day=day, open_minute=open_minute, close_minute=close_minute)
+                    for day, open_minute, close_minute in opening_intervals(restaurant.operating_hours)
+                )
+            # bulk_update leaves updated_at untouched, this is not a content change
+            with transaction.atomic():
+                Restaurant.objects.bulk_update(batch, SEARCH_FIELDS)
+                OpeningInterval.objects.filter(restaurant__in=batch).delete()
+                OpeningInterval.objects.bulk_create(intervals)
+
+            updated += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'Updated {updated} restaurants', ending='\r')
+
+        # bulk_update sends no signals and leaves updated_at alone, so
+        # incremental index syncs cannot see these changes: ask for full
+        # rebuilds and invalidate cached searches explicitly
+        request_full_reindex()
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search fields for {updated} restaurants'))
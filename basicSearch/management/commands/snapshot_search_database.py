@@ -0,0 +1,70 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from basicSearch.caching import bump_generation
+from basicSearch.models import Restaurant, RestaurantTombstone, SyncState
+from basicSearch.routers import SEARCH_DATABASE
+
+
+def data_version(connection):
+    """
+    Summary of the searchable data in a database, which changes with every
+    save, delete, ingest or reindex; None when the tables do not exist yet
+    """
+    queries = [
+        f'SELECT max(updated_at), count(*) FROM "{Restaurant._meta.db_table}"',
+        f'SELECT max(deleted_at), count(*) FROM "{RestaurantTombstone._meta.db_table}"',
+        f'SELECT max(watermark), count(*) FROM "{SyncState._meta.db_table}"',
+    ]
+    try:
+        return tuple(value for query in queries for value in connection.execute(query).fetchone())
+    except sqlite3.OperationalError:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database to the read-only search database (SEARCH_DATABASE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Take a snapshot every this many seconds until interrupted '
+                                 '(0: once)')
+
+    def handle(self, *args, **options):
+        if SEARCH_DATABASE not in settings.DATABASES:
+            raise CommandError('SEARCH_DATABASE is not set')
+        while True:
+            start = time.perf_counter()
+            changed = self._snapshot()
+            self.stdout.write(
+                f'Search database updated in {time.perf_counter() - start:.2f}s'
+                f'{"" if changed else " (no changes, search cache kept)"}'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def _snapshot(self):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'], timeout=20)
+        target = sqlite3.connect(settings.DATABASES[SEARCH_DATABASE]['NAME'], timeout=20)
+        try:
+            # In WAL mode, search requests keep reading the previous snapshot
+            # while the copy is written, then see the new one all at once
+            target.execute('PRAGMA journal_mode=WAL')
+            previous = data_version(target)
+            # A consistent copy of the primary, read without blocking its writers
+            source.backup(target)
+            target.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            current = data_version(target)
+        finally:
+            source.close()
+            target.close()
+        # Cached searches were computed from the previous snapshot, which
+        # they still match when no data changed in between
+        changed = current is None or current != previous
+        if changed:
+            bump_generation()
+        return changed
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'basicSearch_restaurant_fts'
+
+CREATE_SQL = [
+    # External content table: the text lives in basicSearch_restaurant and
+    # the FTS index is keyed by that table's rowid
+    f"""
+    CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(
+        name, cuisine, address, neighbourhood,
+        content='basicSearch_restaurant', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_insert" AFTER INSERT ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" (rowid, name, cuisine, address, neighbourhood)
+        VALUES (new.rowid, new.name, new.cuisine, new.address, new.neighbourhood);
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_delete" AFTER DELETE ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}", rowid, name, cuisine, address, neighbourhood)
+        VALUES ('delete', old.rowid, old.name, old.cuisine, old.address, old.neighbourhood);
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_update" AFTER UPDATE ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}", rowid, name, cuisine, address, neighbourhood)
+        VALUES ('delete', old.rowid, old.name, old.cuisine, old.address, old.neighbourhood);
+        INSERT INTO "{FTS_TABLE}" (rowid, name, cuisine, address, neighbourhood)
+        VALUES (new.rowid, new.name, new.cuisine, new.address, new.neighbourhood);
+    END
+    """,
+    # Index the rows that already exist
+    f"""INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}") VALUES ('rebuild')""",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_insert"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_delete"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_update"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+
+def create_fts(apps, schema_editor):
+    # FTS5 is SQLite only, other databases keep using the other backends
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
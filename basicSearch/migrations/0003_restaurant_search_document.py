@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0002_restaurant_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
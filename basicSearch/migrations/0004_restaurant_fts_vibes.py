@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'basicSearch_restaurant_fts'
+COLUMNS = 'name, cuisine, address, neighbourhood, vibes'
+NEW_COLUMNS = 'new.name, new.cuisine, new.address, new.neighbourhood, new.vibes'
+OLD_COLUMNS = 'old.name, old.cuisine, old.address, old.neighbourhood, old.vibes'
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_insert"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_delete"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_update"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+# Same table as migration 0002 plus the vibes JSON list; the tokenizer
+# splits '["cozy", "dogfriendly"]' into searchable words
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(
+        {COLUMNS},
+        content='basicSearch_restaurant', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_insert" AFTER INSERT ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" (rowid, {COLUMNS}) VALUES (new.rowid, {NEW_COLUMNS});
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_delete" AFTER DELETE ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}", rowid, {COLUMNS}) VALUES ('delete', old.rowid, {OLD_COLUMNS});
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_update" AFTER UPDATE ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}", rowid, {COLUMNS}) VALUES ('delete', old.rowid, {OLD_COLUMNS});
+        INSERT INTO "{FTS_TABLE}" (rowid, {COLUMNS}) VALUES (new.rowid, {NEW_COLUMNS});
+    END
+    """,
+    f"""INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}") VALUES ('rebuild')""",
+]
+
+
+def recreate_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL + CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def restore_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from importlib import import_module
+    previous = import_module('basicSearch.migrations.0002_restaurant_fts')
+    for statement in DROP_SQL + previous.CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0003_restaurant_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_fts, restore_fts),
+    ]
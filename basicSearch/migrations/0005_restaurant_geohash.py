@@ -0,0 +1,26 @@
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+def recreate_fts(apps, schema_editor):
+    # Adding or removing a column makes Django rebuild the SQLite table, which
+    # drops the FTS triggers and renumbers the rowids the FTS index is keyed by
+    import_module('basicSearch.migrations.0004_restaurant_fts_vibes').recreate_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0004_restaurant_fts_vibes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts),
+        migrations.AddField(
+            model_name='restaurant',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(recreate_fts, migrations.RunPython.noop),
+    ]
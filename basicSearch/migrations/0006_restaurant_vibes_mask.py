@@ -0,0 +1,25 @@
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+def recreate_fts(apps, schema_editor):
+    # Same table rebuild as in 0005
+    import_module('basicSearch.migrations.0004_restaurant_fts_vibes').recreate_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0005_restaurant_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts),
+        migrations.AddField(
+            model_name='restaurant',
+            name='vibes_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(recreate_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0006_restaurant_vibes_mask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-rating', 'name', 'id'], name='restaurant_rating_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['price_range', '-rating', 'name', 'id'], name='restaurant_price_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['reservation_partner', '-rating', 'name', 'id'], name='restaurant_partner_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['cuisine', '-rating', 'name', 'id'], name='restaurant_cuisine_rating_idx'),
+        ),
+    ]
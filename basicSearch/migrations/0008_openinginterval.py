@@ -0,0 +1,102 @@
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copies, as of this migration, of basicSearch.hours, so later changes to
+# the parser cannot change what it writes.
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+MINUTES_PER_DAY = 24 * 60
+
+TIME_RE = re.compile(r'^(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?$', re.IGNORECASE)
+RANGE_SEPARATOR_RE = re.compile(r'\s*(?:-|–|—|\bto\b)\s*', re.IGNORECASE)
+
+
+def parse_time(text):
+    text = text.strip().lower()
+    if text == 'noon':
+        return 12 * 60
+    if text == 'midnight':
+        return 0
+    match = TIME_RE.match(text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.startswith('p') else 0)
+    if hour > 24 or minute > 59 or (hour == 24 and minute):
+        return None
+    return hour * 60 + minute
+
+
+def parse_hours(text):
+    if not isinstance(text, str):
+        return []
+    if text.strip().lower() in ('open 24 hours', '24 hours', '24/7'):
+        return [(0, MINUTES_PER_DAY)]
+
+    ranges = []
+    for part in re.split(r'[,;]', text):
+        times = RANGE_SEPARATOR_RE.split(part.strip())
+        if len(times) != 2:
+            continue
+        open_minute, close_minute = parse_time(times[0]), parse_time(times[1])
+        if open_minute is None or close_minute is None:
+            continue
+        ranges.append((open_minute, close_minute))
+    return ranges
+
+
+def opening_intervals(operating_hours):
+    intervals = []
+    for day, name in enumerate(DAYS):
+        for open_minute, close_minute in parse_hours((operating_hours or {}).get(name)):
+            if close_minute > open_minute:
+                intervals.append((day, open_minute, close_minute))
+                continue
+            intervals.append((day, open_minute, MINUTES_PER_DAY))
+            if close_minute:
+                intervals.append(((day + 1) % 7, 0, close_minute))
+    return intervals
+
+
+def fill_intervals(apps, schema_editor):
+    Restaurant = apps.get_model('basicSearch', 'Restaurant')
+    OpeningInterval = apps.get_model('basicSearch', 'OpeningInterval')
+    intervals = []
+    for pk, operating_hours in Restaurant.objects.values_list('pk', 'operating_hours').iterator():
+        for day, open_minute, close_minute in opening_intervals(operating_hours):
+            intervals.append(OpeningInterval(
+                restaurant_id=pk, day=day, open_minute=open_minute, close_minute=close_minute,
+            ))
+    OpeningInterval.objects.bulk_create(intervals, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0007_restaurant_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveSmallIntegerField()),
+                ('open_minute', models.PositiveSmallIntegerField()),
+                ('close_minute', models.PositiveSmallIntegerField()),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='basicSearch.restaurant')),
+            ],
+            options={
+                'ordering': ['day', 'open_minute'],
+                'indexes': [models.Index(fields=['day', 'open_minute', 'close_minute', 'restaurant'], name='opening_interval_day_idx')],
+            },
+        ),
+        migrations.RunPython(fill_intervals, migrations.RunPython.noop),
+    ]
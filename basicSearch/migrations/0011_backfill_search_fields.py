@@ -0,0 +1,114 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+
+# The normalization, geohash and vibe bits below are copies, as of this
+# migration, of basicSearch.text, basicSearch.geo and Restaurant.VIBES_CHOICES,
+# so later changes to those modules cannot change what it writes.
+
+SEARCH_FIELDS = ['search_document', 'geohash', 'vibes_mask']
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+
+# (choice, label) in bit order: bit n of vibes_mask is the n-th choice
+VIBES = [
+    ('aesthetic', 'aesthetic'), ('bar', 'bar'), ('brunch', 'brunch'), ('business', 'business'),
+    ('casual', 'casual'), ('chic', 'chic'), ('clubesque', 'clubesque'), ('cozy', 'cozy'),
+    ('crowded', 'crowded'), ('date', 'date'), ('dj', 'dj'), ('dogfriendly', 'dog friendly'),
+    ('drinks', 'drinks'), ('fancy', 'fancy'), ('finedining', 'fine fining'),
+    ('foodexperience', 'food experience'), ('intimate', 'intimate'), ('largegroups', 'large groups'),
+    ('largespace', 'large space'), ('liveevents', 'live events'), ('livemusic', 'live music'),
+    ('loud', 'loud'), ('michelin', 'michelin'), ('notcrowded', 'not crowded'), ('patio', 'patio'),
+    ('pool', 'pool'), ('privatedining', 'private dining'), ('quiet', 'quiet'), ('rooftop', 'rooftop'),
+    ('shareable', 'shareable'), ('smallgroups', 'small groups'), ('smallplates', 'small plates'),
+    ('smallspace', 'small space'), ('snacks', 'snacks'), ('speakeasy', 'speakeasy'), ('vegan', 'vegan'),
+    ('vegetarian', 'vegetarian'), ('view', 'view'), ('walkIn', 'walk-in'),
+]
+VIBE_LABELS = dict(VIBES)
+VIBE_BITS = {choice: 1 << position for position, (choice, label) in enumerate(VIBES)}
+
+
+def normalize_text(text):
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return WHITESPACE_RE.sub(' ', folded.lower()).strip()
+
+
+def build_search_document(restaurant):
+    parts = [restaurant.name, restaurant.cuisine, restaurant.address, restaurant.neighbourhood]
+    for vibe in restaurant.vibes or []:
+        parts.append(vibe)
+        label = VIBE_LABELS.get(vibe)
+        if label and label != vibe:
+            parts.append(label)
+    return ' | '.join(normalize_text(part) for part in parts if part)
+
+
+def encode_geohash(latitude, longitude):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def fill_search_fields(apps, schema_editor):
+    # 0003, 0005 and 0006 added the denormalized search columns empty; rows
+    # saved before them would not be found until the next save
+    Restaurant = apps.get_model('basicSearch', 'Restaurant')
+    restaurants = Restaurant.objects.only(
+        'pk', 'name', 'cuisine', 'address', 'neighbourhood', 'vibes', 'latitude', 'longitude',
+    ).order_by('pk')
+    last_pk = None
+    while True:
+        page = restaurants if last_pk is None else restaurants.filter(pk__gt=last_pk)
+        batch = list(page[:1000])
+        if not batch:
+            break
+        for restaurant in batch:
+            restaurant.search_document = build_search_document(restaurant)
+            if restaurant.latitude is not None and restaurant.longitude is not None:
+                restaurant.geohash = encode_geohash(float(restaurant.latitude), float(restaurant.longitude))
+            else:
+                restaurant.geohash = ''
+            restaurant.vibes_mask = 0
+            for vibe in restaurant.vibes or []:
+                restaurant.vibes_mask |= VIBE_BITS.get(vibe, 0)
+        # Not a content change: updated_at is left alone
+        Restaurant.objects.bulk_update(batch, SEARCH_FIELDS)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0010_restaurant_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+FTS_TABLE = 'basicSearch_restaurant_fts'
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_insert"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_delete"',
+    'DROP TRIGGER IF EXISTS "basicSearch_restaurant_fts_update"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+# FTS5 over the same search_document the other backends match, keyed by the
+# restaurant id rather than the rowid. content_rowid has to be an integer
+# and the id is a UUID, so the table stores its own copy of the document and
+# rows are found by a MATCH on the restaurant_id column. Table rebuilds in
+# later migrations only drop the triggers; call recreate_fts after them.
+# tokenchars '_' splits words like the \w+ of text.tokenize.
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(
+        restaurant_id, search_document,
+        tokenize="unicode61 remove_diacritics 2 tokenchars '_'"
+    )
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_insert" AFTER INSERT ON "basicSearch_restaurant" BEGIN
+        INSERT INTO "{FTS_TABLE}" (restaurant_id, search_document) VALUES (new.id, new.search_document);
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_delete" AFTER DELETE ON "basicSearch_restaurant" BEGIN
+        DELETE FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH 'restaurant_id:"' || old.id || '"';
+    END
+    """,
+    f"""
+    CREATE TRIGGER "basicSearch_restaurant_fts_update" AFTER UPDATE OF id, search_document ON "basicSearch_restaurant"
+    WHEN old.id IS NOT new.id OR old.search_document IS NOT new.search_document BEGIN
+        DELETE FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH 'restaurant_id:"' || old.id || '"';
+        INSERT INTO "{FTS_TABLE}" (restaurant_id, search_document) VALUES (new.id, new.search_document);
+    END
+    """,
+    f"""
+    INSERT INTO "{FTS_TABLE}" (restaurant_id, search_document)
+    SELECT id, search_document FROM "basicSearch_restaurant"
+    """,
+]
+
+
+def recreate_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL + CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def restore_fts(apps, schema_editor):
+    import_module('basicSearch.migrations.0004_restaurant_fts_vibes').recreate_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basicSearch', '0011_backfill_search_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_fts, restore_fts),
+    ]
@@ -1,5 +1,10 @@
 import uuid
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .geo import encode_geohash
+from .hours import DAYS, opening_intervals
+from .text import build_search_document
 
 # Create your models here.
 
@@ -83,6 +88,9 @@ class Restaurant(models.Model):
         ('view', 'view'),
         ('walkIn', 'walk-in'),
     ]
+    VIBE_LABELS = dict(VIBES_CHOICES)
+    # Bit of each vibe in vibes_mask; new vibes must be appended to keep the bits stable
+    VIBE_BITS = {choice: 1 << position for position, (choice, label) in enumerate(VIBES_CHOICES)}
     vibes = models.JSONField(default=list, blank=True)
     
     # Images (stored as JSON array of URLs)
@@ -99,6 +107,11 @@ class Restaurant(models.Model):
     ], default='$$', blank=True)
     phone = models.CharField(max_length=20, blank=True)
     
+    # Search (lowercase, accent-folded name/cuisine/address/neighbourhood/vibes)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    vibes_mask = models.BigIntegerField(default=0, editable=False)
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -106,16 +119,56 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.refresh_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_document', 'geohash', 'vibes_mask'}
+        using = kwargs.get('using') or router.db_for_write(Restaurant, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if not update_fields or 'operating_hours' in update_fields:
+                self.refresh_opening_intervals()
+    
+    def refresh_search_fields(self):
+        """Recompute the denormalized search columns from the other fields"""
+        self.search_document = build_search_document(self, self.VIBE_LABELS)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = ''
+        self.vibes_mask = 0
+        for vibe in self.vibes or []:
+            self.vibes_mask |= self.VIBE_BITS.get(vibe, 0)
+    
+    def refresh_opening_intervals(self):
+        """Replace the OpeningInterval rows of a saved restaurant with its parsed operating_hours"""
+        self.opening_intervals.all().delete()
+        OpeningInterval.objects.bulk_create(
+            OpeningInterval(restaurant=self, day=day, open_minute=open_minute, close_minute=close_minute)
+            for day, open_minute, close_minute in opening_intervals(self.operating_hours)
+        )
+    
     class Meta:
         ordering = ['-rating', 'name']
+        # The search ordering, alone and after each equality filter, so a
+        # filtered page is an index range read in order. id makes the order
+        # total for keyset pagination.
+        indexes = [
+            models.Index(fields=['-rating', 'name', 'id'], name='restaurant_rating_name_idx'),
+            models.Index(fields=['price_range', '-rating', 'name', 'id'], name='restaurant_price_rating_idx'),
+            models.Index(fields=['reservation_partner', '-rating', 'name', 'id'], name='restaurant_partner_rating_idx'),
+            models.Index(fields=['cuisine', '-rating', 'name', 'id'], name='restaurant_cuisine_rating_idx'),
+            # Incremental syncs and Last-Modified
+            models.Index(fields=['updated_at'], name='restaurant_updated_at_idx'),
+        ]
     
     def get_today_hours(self):
         """Get today's operating hours"""
         if not self.operating_hours:
             return None
         
-        from datetime import datetime
-        today = datetime.now().strftime('%A').lower()
+        today = DAYS[timezone.localtime().weekday()]
         return self.operating_hours.get(today, None)
     
     def get_vibes_display(self):
@@ -123,5 +176,48 @@ class Restaurant(models.Model):
         if not self.vibes:
             return []
         
-        vibes_dict = dict(self.VIBES_CHOICES)
-        return [vibes_dict.get(vibe, vibe) for vibe in self.vibes]
+        return [self.VIBE_LABELS.get(vibe, vibe) for vibe in self.vibes]
+
+
+class OpeningInterval(models.Model):
+    """
+    One opening period of a restaurant within a day, parsed from
+    operating_hours on save (see hours.opening_intervals).
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='opening_intervals')
+    day = models.PositiveSmallIntegerField()  # 0 = Monday
+    open_minute = models.PositiveSmallIntegerField()  # minutes after midnight
+    close_minute = models.PositiveSmallIntegerField()  # exclusive, 1440 = midnight
+    
+    class Meta:
+        ordering = ['day', 'open_minute']
+        # "Open at" is a range read on (day, open_minute) that never visits
+        # the table, restaurant is in the index too
+        indexes = [
+            models.Index(fields=['day', 'open_minute', 'close_minute', 'restaurant'], name='opening_interval_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.restaurant} {DAYS[self.day]} {self.open_minute}-{self.close_minute}'
+
+
+class RestaurantTombstone(models.Model):
+    """
+    Record of a deleted restaurant, so incremental syncs (which only see
+    rows changed since their watermark) learn about deletes too.
+    """
+    restaurant_id = models.UUIDField()
+    place_id = models.CharField(max_length=255, blank=True, null=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f'{self.place_id or self.restaurant_id} deleted at {self.deleted_at}'
+
+
+class SyncState(models.Model):
+    """High-water mark of an incremental sync, by name"""
+    name = models.CharField(max_length=255, unique=True)
+    watermark = models.DateTimeField()
+    
+    def __str__(self):
+        return f'{self.name}: {self.watermark}'
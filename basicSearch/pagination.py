@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque token"""
+    plain = [str(value) if isinstance(value, (Decimal, UUID)) else value for value in values]
+    data = json.dumps(plain, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Decode a cursor produced by encode_cursor for the given ordering"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match the result ordering')
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Build the predicate selecting rows strictly after values in ordering.
+
+    For ('-rating', 'name', 'id') this is
+    rating < r OR (rating = r AND name > n) OR (rating = r AND name = n AND id > i)
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def sort_key(row, ordering):
+    """Values of the ordering fields for a model instance or values() dict"""
+    names = [field.lstrip('-') for field in ordering]
+    if isinstance(row, dict):
+        return [row[name] for name in names]
+    return [getattr(row, name) for name in names]
+
+
+def apply_cursor(queryset, ordering, cursor):
+    """Restrict queryset to the rows after cursor in ordering (all rows without cursor)"""
+    if not cursor:
+        return queryset
+    return queryset.filter(keyset_filter(ordering, decode_cursor(cursor, ordering)))
+
+
+def paginate(queryset, ordering, limit, cursor=None):
+    """
+    Fetch one page of queryset with keyset pagination.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Only limit + 1 rows are read from the database.
+    """
+    queryset = apply_cursor(queryset.order_by(*ordering), ordering, cursor)
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort_key(rows[-1], ordering))
@@ -0,0 +1,133 @@
+import contextvars
+import functools
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Database alias of the read-only search copy (see settings.SEARCH_DATABASE)
+SEARCH_DATABASE = 'search'
+
+# Cookie holding the time until which a client that wrote reads the primary
+STICKY_COOKIE = 'read_primary_until'
+
+# Alias the reads of the running view go to, None for the default routing
+_read_database = contextvars.ContextVar('read_database', default=None)
+
+# {'wrote': bool} of the running request, set by ReadYourWritesMiddleware
+_request_writes = contextvars.ContextVar('request_writes', default=None)
+
+
+def search_database_for(request):
+    """
+    Database alias a search/detail request reads from: the search copy when
+    one is configured, unless the client wrote within the sticky window
+    """
+    if SEARCH_DATABASE not in settings.DATABASES:
+        return 'default'
+    try:
+        if float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time():
+            return 'default'
+    except ValueError:
+        pass
+    return SEARCH_DATABASE
+
+
+def read_database():
+    """Alias the running view reads basicSearch models from"""
+    return _read_database.get() or 'default'
+
+
+def reads_search_database(view):
+    """Route the basicSearch reads of a (sync or async) view to search_database_for(request)"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _read_database.set(search_database_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_database.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _read_database.set(search_database_for(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _read_database.reset(token)
+    return wrapper
+
+
+class SearchRouter:
+    """
+    Send the basicSearch reads of views wrapped in reads_search_database to
+    their database, and every write and migration to the primary ('default').
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'basicSearch':
+            return _read_database.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'basicSearch':
+            writes = _request_writes.get()
+            if writes is not None:
+                writes['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The search copy is written by snapshot_search_database (or replication) only
+        return db == 'default'
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a request that wrote basicSearch rows (an admin edit, a data load),
+    make the client read the primary for SEARCH_DATABASE_STICKY_SECONDS, so
+    it sees its own changes before the search copy catches up.
+
+    Written without MiddlewareMixin: its process_request() runs in a thread
+    under ASGI, where setting the context variable would not reach the view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self._stick(response, writes)
+
+    async def __acall__(self, request):
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self._stick(response, writes)
+
+    def _stick(self, response, writes):
+        if writes['wrote'] and SEARCH_DATABASE in settings.DATABASES:
+            sticky = settings.SEARCH_DATABASE_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + sticky:.0f}', max_age=sticky, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,283 @@
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.fields.json import KT
+
+from . import geo
+from .models import OpeningInterval, Restaurant
+from .pagination import apply_cursor
+from .search_index import search_index
+from .text import normalize_text, tokenize
+
+
+# SQLite FTS5 table mirroring the searchable columns (see migration 0002)
+FTS_TABLE = 'basicSearch_restaurant_fts'
+
+# bm25 weights for the FTS columns: restaurant_id, search_document
+FTS_WEIGHTS = (0.0, 1.0)
+
+# Result orderings. The trailing id makes them total orders, which keyset
+# pagination needs to never skip or repeat a row between pages.
+DEFAULT_ORDERING = ('-rating', 'name', 'id')
+RELEVANCE_ORDERING = ('rank',) + DEFAULT_ORDERING
+DISTANCE_ORDERING = ('distance', 'id')
+
+# Columns read for a search result row. The images, operating hours, social
+# URLs and timestamps are never loaded.
+RESULT_FIELDS = (
+    'id', 'name', 'cuisine', 'address', 'neighbourhood', 'rating',
+    'price_range', 'vibes', 'reservation_partner',
+)
+
+# Fields the batch lookup API can return (all are cached per restaurant),
+# and those it returns when the client does not choose
+RESTAURANT_FIELDS = (
+    'id', 'name', 'cuisine', 'address', 'neighbourhood', 'rating', 'price_range', 'vibes',
+    'reservation_partner', 'main_image', 'images', 'latitude', 'longitude', 'phone', 'website',
+    'reservation_url', 'menu_url', 'operating_hours', 'updated_at',
+)
+DEFAULT_RESTAURANT_FIELDS = RESULT_FIELDS + ('main_image',)
+
+# Columns read for RESTAURANT_FIELDS
+RESTAURANT_COLUMNS = tuple(field for field in RESTAURANT_FIELDS if field != 'main_image')
+
+# Columns filtered on by value, each backed by a (column, -rating, name, id)
+# index (see Restaurant.Meta.indexes)
+ATTRIBUTE_FILTERS = ('price_range', 'reservation_partner', 'cuisine')
+
+# Lowercase vibe labels shown in search results
+RESULT_VIBE_LABELS = {choice: label.lower() for choice, label in Restaurant.VIBES_CHOICES}
+
+
+def restrict_to_ids(queryset, ids):
+    """Limit a queryset to the given primary keys (UUID hex strings)"""
+    if not ids:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        # A single JSON parameter avoids SQLite's limit on bound variables
+        return queryset.filter(pk__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(list(ids))]))
+    return queryset.filter(pk__in=list(ids))
+
+
+def fts_match_expression(query):
+    """
+    Build an FTS5 MATCH expression requiring every query word as a prefix
+    of a search_document word.
+    """
+    words = ' '.join(f'"{token}"*' for token in tokenize(query))
+    return f'search_document : ({words})' if words else ''
+
+
+def fts_search(queryset, query):
+    """Match the query with FTS5 and order the results by bm25 relevance"""
+    match = fts_match_expression(query)
+    if not match:
+        return queryset.none()
+
+    table = Restaurant._meta.db_table
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'"{FTS_TABLE}".restaurant_id = "{table}".id', f'"{FTS_TABLE}" MATCH %s'],
+        params=[match],
+    ).annotate(
+        rank=RawSQL(f'bm25("{FTS_TABLE}", {weights})', ()),
+    ).order_by(*RELEVANCE_ORDERING)
+
+
+def filter_restaurants(queryset, query, generation=None):
+    """
+    Apply the free text search to a Restaurant queryset.
+
+    generation is the current search cache generation; the in-memory index
+    is rebuilt when it was changed by another process.
+    """
+    if not query:
+        return queryset
+
+    backend = getattr(settings, 'SEARCH_BACKEND', 'index')
+    if backend == 'index':
+        if generation is not None:
+            search_index.ensure_current(generation)
+        return restrict_to_ids(queryset, search_index.search(query))
+    if backend == 'fts':
+        return fts_search(queryset, query)
+
+    # Single column scan over the precomputed, normalized search document
+    return queryset.filter(search_document__contains=normalize_text(query))
+
+
+def result_ordering(queryset):
+    """Ordering used to paginate a queryset returned by filter_restaurants"""
+    if 'distance' in queryset.query.annotations:
+        return DISTANCE_ORDERING
+    if 'rank' in queryset.query.annotations:
+        return RELEVANCE_ORDERING
+    return DEFAULT_ORDERING
+
+
+def filter_near(queryset, near, limit, cursor=None):
+    """
+    Restrict a Restaurant queryset to a location search, sorted by distance.
+
+    near holds lat, lng and an optional radius in km. Without a radius this
+    is a k-nearest search: the radius is widened until the page (after
+    cursor) can be filled; with limit None, every located restaurant is kept.
+    """
+    queryset = geo.annotate_distance(queryset, near['lat'], near['lng'])
+    radius = near.get('radius')
+    if radius is None:
+        if limit is None:
+            return queryset
+        remaining = apply_cursor(queryset, DISTANCE_ORDERING, cursor)
+        radius = geo.nearest_radius(remaining, near['lat'], near['lng'], limit + 1)
+        if radius is None:
+            # Fewer rows than a page in the whole table
+            return queryset
+    return geo.within_radius(queryset, near['lat'], near['lng'], radius)
+
+
+def filter_attributes(queryset, filters):
+    """
+    Apply the price_range, reservation_partner, cuisine (lists of accepted
+    values) and min_rating entries of filters to a Restaurant queryset.
+    """
+    for name in ATTRIBUTE_FILTERS:
+        values = filters.get(name)
+        if values:
+            queryset = queryset.filter(**{name: values[0]} if len(values) == 1 else {f'{name}__in': values})
+    if 'min_rating' in filters:
+        queryset = queryset.filter(rating__gte=Decimal(str(filters['min_rating'])))
+    return queryset
+
+
+def filter_open_at(queryset, day, minute):
+    """
+    Keep restaurants open at minute (after midnight) of day (0 = Monday).
+
+    One range read on the OpeningInterval (day, open_minute) index; the
+    operating_hours strings are parsed on save, never here.
+    """
+    open_ids = OpeningInterval.objects.filter(
+        day=day, open_minute__lte=minute, close_minute__gt=minute,
+    ).values('restaurant_id')
+    return queryset.filter(pk__in=open_ids)
+
+
+def filter_vibes(queryset, vibes, match_all=True):
+    """Keep restaurants having all (or with match_all=False, any) of vibes"""
+    mask = 0
+    for vibe in vibes:
+        mask |= Restaurant.VIBE_BITS[vibe]
+    queryset = queryset.alias(matched_vibes=F('vibes_mask').bitand(mask))
+    if match_all:
+        return queryset.filter(matched_vibes=mask)
+    return queryset.filter(matched_vibes__gt=0)
+
+
+def vibe_facets(queryset):
+    """
+    Number of restaurants of queryset per vibe, computed by the database in
+    a single pass of bitwise sums over vibes_mask. Vibes with no restaurant
+    are left out.
+    """
+    sums = queryset.order_by().aggregate(**{
+        vibe: Sum(F('vibes_mask').bitand(bit)) for vibe, bit in Restaurant.VIBE_BITS.items()
+    })
+    facets = {}
+    for vibe, bit in Restaurant.VIBE_BITS.items():
+        if sums[vibe]:
+            facets[vibe] = sums[vibe] // bit
+    return facets
+
+
+def count_vibe_facets(masks):
+    """vibe_facets() for vibes_mask values already in memory"""
+    counts = {}
+    for mask in masks:
+        counts[mask] = counts.get(mask, 0) + 1
+    facets = {}
+    for vibe, bit in Restaurant.VIBE_BITS.items():
+        count = sum(number for mask, number in counts.items() if mask & bit)
+        if count:
+            facets[vibe] = count
+    return facets
+
+
+def project_results(queryset, *extra_fields):
+    """
+    Select only the columns a search result needs (plus extra_fields), as
+    values() dicts.
+
+    The first image is extracted by SQLite, so the images list is never
+    decoded in Python.
+    """
+    annotations = [name for name in ('rank', 'distance') if name in queryset.query.annotations]
+    return queryset.values(*RESULT_FIELDS, *annotations, *extra_fields, main_image=KT('images__0'))
+
+
+def serialize_result(row):
+    """Convert a project_results() row to the search API format"""
+    result = {
+        'id': str(row['id']),
+        'name': row['name'],
+        'cuisine': row['cuisine'] or '',
+        'address': row['address'],
+        'neighbourhood': row['neighbourhood'] or '',
+        'rating': float(row['rating']) if row['rating'] else 0.0,
+        'price_range': row['price_range'] or '',
+        'vibes': [RESULT_VIBE_LABELS.get(vibe, vibe).lower() for vibe in (row['vibes'] or [])[:3]],  # First 3 vibes
+        'reservation_partner': row['reservation_partner'],
+        'main_image': row['main_image'],
+    }
+    if 'distance' in row:
+        result['distance'] = round(row['distance'], 3)  # km
+    return result
+
+
+def serialize_restaurant(row):
+    """Convert a values(*RESTAURANT_COLUMNS) row to the batch lookup API format"""
+    return {
+        'id': str(row['id']),
+        'name': row['name'],
+        'cuisine': row['cuisine'] or '',
+        'address': row['address'],
+        'neighbourhood': row['neighbourhood'] or '',
+        'rating': float(row['rating']) if row['rating'] else 0.0,
+        'price_range': row['price_range'] or '',
+        'vibes': [RESULT_VIBE_LABELS.get(vibe, vibe).lower() for vibe in row['vibes'] or []],
+        'reservation_partner': row['reservation_partner'],
+        'main_image': row['images'][0] if row['images'] else None,
+        'images': row['images'] or [],
+        'latitude': float(row['latitude']) if row['latitude'] is not None else None,
+        'longitude': float(row['longitude']) if row['longitude'] is not None else None,
+        'phone': row['phone'],
+        'website': row['website'],
+        'reservation_url': row['reservation_url'],
+        'menu_url': row['menu_url'],
+        'operating_hours': row['operating_hours'] or {},
+        'updated_at': row['updated_at'].isoformat(),
+    }
+
+
+def is_relevance_ranked():
+    """Whether the configured backend orders results by query relevance"""
+    return getattr(settings, 'SEARCH_BACKEND', 'index') == 'fts'
+
+
+def matches_document(query, document):
+    """
+    Evaluate the free text search against a search_document in Python,
+    with the same semantics as the configured backend.
+    """
+    if getattr(settings, 'SEARCH_BACKEND', 'index') == 'orm':
+        return normalize_text(query) in document
+    document_tokens = tokenize(document)
+    return all(
+        any(token.startswith(query_token) for token in document_tokens)
+        for query_token in tokenize(query)
+    )
@@ -0,0 +1,185 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .text import tokenize
+
+
+# Fields of the Restaurant model covered by the free text search
+INDEXED_FIELDS = ('search_document',)
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the restaurant search documents.
+
+    Every query token is matched as a prefix of the indexed tokens and all
+    query tokens must match (AND), so "piz pal" finds "Pizza Palace".
+    Document ids are stored as UUID hex strings, the format SQLite keeps
+    the primary key in.
+
+    The index always reads the primary database: its updated_at watermarks
+    are only meaningful there, and clients reading the primary after a write
+    must find their changes. Search requests served from the search copy
+    filter its ids against the copy anyway.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._postings = {}      # token -> set of document ids
+        self._documents = {}     # document id -> set of tokens
+        self._vocabulary = []    # sorted list of tokens, used for prefix lookups
+        self.is_built = False
+        self.generation = None   # search cache generation the index reflects
+        self.synced_at = None    # database time of the last build or sync
+
+    def build(self, generation=None):
+        """(Re)build the whole index from the database"""
+        from .models import Restaurant
+
+        started = timezone.now()
+        postings = {}
+        documents = {}
+        rows = Restaurant.objects.using(DEFAULT_DB_ALIAS).values_list('pk', *INDEXED_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            doc_id = row[0].hex
+            tokens = set()
+            for value in row[1:]:
+                tokens.update(tokenize(value))
+            documents[doc_id] = tokens
+            for token in tokens:
+                postings.setdefault(token, set()).add(doc_id)
+
+        with self._lock:
+            self._postings = postings
+            self._documents = documents
+            self._vocabulary = sorted(postings)
+            self.is_built = True
+            self.generation = generation
+            self.synced_at = started
+
+    def ensure_built(self):
+        if not self.is_built:
+            with self._build_lock:
+                if not self.is_built:
+                    self.build()
+
+    def sync(self, generation=None):
+        """
+        Apply the restaurants changed or deleted since the last build or sync,
+        found by their updated_at and tombstones. Falls back to a full build
+        when the changes may not all be visible that way.
+        """
+        from .models import Restaurant, RestaurantTombstone
+        from .sync import FULL_REINDEX, get_watermark
+
+        started = timezone.now()
+        retention = timedelta(seconds=settings.SEARCH_TOMBSTONE_RETENTION)
+        full_reindex = get_watermark(FULL_REINDEX, using=DEFAULT_DB_ALIAS)
+        if (not self.is_built or self.synced_at < started - retention
+                or (full_reindex is not None and full_reindex >= self.synced_at)):
+            self.build(generation)
+            return
+
+        since = self.synced_at - timedelta(seconds=settings.SEARCH_SYNC_OVERLAP)
+        restaurants = Restaurant.objects.using(DEFAULT_DB_ALIAS)
+        tombstones = RestaurantTombstone.objects.using(DEFAULT_DB_ALIAS)
+        changed = list(restaurants.filter(updated_at__gte=since).values_list('pk', *INDEXED_FIELDS))
+        deleted = list(tombstones.filter(deleted_at__gte=since).values_list('restaurant_id', flat=True))
+        with self._lock:
+            for row in changed:
+                self._add(row[0].hex, row[1:])
+            for restaurant_id in deleted:
+                self._remove(restaurant_id.hex)
+            self.generation = generation
+            self.synced_at = started
+
+    def ensure_current(self, generation):
+        """Build the index, or sync it if the data changed in another process"""
+        if self.is_built and self.generation == generation:
+            return
+        with self._build_lock:
+            if not (self.is_built and self.generation == generation):
+                self.sync(generation)
+
+    def changed(self, generation):
+        """
+        Record the generation created by a change this process already applied.
+
+        If another process bumped the generation in between, the index is
+        left behind and gets synced by the next ensure_current().
+        """
+        with self._lock:
+            if self.generation is not None and generation == self.generation + 1:
+                self.generation = generation
+
+    def add(self, restaurant):
+        """Index a restaurant, replacing any previous version of it"""
+        self._add(restaurant.pk.hex, [getattr(restaurant, field) for field in INDEXED_FIELDS])
+
+    def _add(self, doc_id, values):
+        tokens = set()
+        for value in values:
+            tokens.update(tokenize(value))
+
+        with self._lock:
+            self._remove(doc_id)
+            self._documents[doc_id] = tokens
+            for token in tokens:
+                if token not in self._postings:
+                    self._postings[token] = set()
+                    insort(self._vocabulary, token)
+                self._postings[token].add(doc_id)
+
+    def remove(self, restaurant_id):
+        with self._lock:
+            self._remove(restaurant_id.hex)
+
+    def _remove(self, doc_id):
+        for token in self._documents.pop(doc_id, ()):
+            ids = self._postings[token]
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+    def _prefix_matches(self, prefix):
+        """Union of the postings of every token starting with prefix"""
+        matches = set()
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary):
+            token = self._vocabulary[position]
+            if not token.startswith(prefix):
+                break
+            matches |= self._postings[token]
+            position += 1
+        return matches
+
+    def search(self, query):
+        """Return the set of document ids matching every token of query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return set()
+
+        self.ensure_built()
+        with self._lock:
+            # Longest tokens first, they usually have the smallest postings
+            result = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                matches = self._prefix_matches(token)
+                result = matches if result is None else result & matches
+                if not result:
+                    return set()
+            return result
+
+    def __len__(self):
+        return len(self._documents)
+
+
+# Process-wide index used by the search view
+search_index = SearchIndex()
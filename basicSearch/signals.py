@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_generation, detail_cache_key, forget_restaurants, search_cache
+from .models import Restaurant, RestaurantTombstone
+from .search_index import search_index
+
+
+def invalidate_search_cache():
+    """Start a new search cache generation once the change is committed"""
+    search_index.changed(bump_generation())
+
+
+def invalidate_restaurant(restaurant_id):
+    """Drop the rendered detail page and the batch lookup entries of a restaurant"""
+    search_cache.delete(detail_cache_key(restaurant_id))
+    forget_restaurants([restaurant_id])
+
+
+@receiver(post_save, sender=Restaurant)
+def index_restaurant(sender, instance, **kwargs):
+    """Keep the in-memory search index and the search cache in sync with saved restaurants"""
+    def apply():
+        # After the commit, so a rolled back save never reaches the index
+        if search_index.is_built:
+            search_index.add(instance)
+        invalidate_search_cache()
+
+    transaction.on_commit(apply)
+    transaction.on_commit(lambda: invalidate_restaurant(instance.pk))
+
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant(sender, instance, **kwargs):
+    """Drop deleted restaurants from the in-memory search index and the search cache"""
+    # Lets the other processes' incremental syncs see the delete
+    RestaurantTombstone.objects.create(restaurant_id=instance.pk, place_id=instance.place_id)
+    restaurant_id = instance.pk
+
+    def apply():
+        if search_index.is_built:
+            search_index.remove(restaurant_id)
+        invalidate_search_cache()
+
+    transaction.on_commit(apply)
+    transaction.on_commit(lambda: invalidate_restaurant(restaurant_id))
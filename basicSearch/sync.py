@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RestaurantTombstone, SyncState
+
+
+# SyncState name whose watermark is the last time the search columns were
+# rewritten without touching updated_at; indexes synced before must rebuild
+FULL_REINDEX = 'search_index:full_reindex'
+
+
+def get_watermark(name, using=None):
+    """Watermark stored under name, or None if there was no run yet"""
+    return SyncState.objects.db_manager(using).filter(name=name).values_list('watermark', flat=True).first()
+
+
+async def aget_watermark(name):
+    return await SyncState.objects.filter(name=name).values_list('watermark', flat=True).afirst()
+
+
+def set_watermark(name, watermark):
+    SyncState.objects.update_or_create(name=name, defaults={'watermark': watermark})
+
+
+def request_full_reindex():
+    """Make every process rebuild its search index from scratch on its next sync"""
+    set_watermark(FULL_REINDEX, timezone.now())
+
+
+def purge_tombstones():
+    """Delete tombstones older than SEARCH_TOMBSTONE_RETENTION"""
+    cutoff = timezone.now() - timedelta(seconds=settings.SEARCH_TOMBSTONE_RETENTION)
+    return RestaurantTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
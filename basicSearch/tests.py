@@ -1,3 +1,935 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext, ignore_warnings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_views, caching, typeahead
+from .cache_backends import SQLiteCache
+from .caching import detail_cache_key, restaurant_cache_key, search_cache
+from .geo import KM_PER_DEGREE, encode_geohash
+from .hours import opening_intervals, parse_time
+from .models import OpeningInterval, Restaurant, RestaurantTombstone
+from .routers import (
+    SEARCH_DATABASE, STICKY_COOKIE, ReadYourWritesMiddleware, SearchRouter, read_database, reads_search_database,
+)
+from .search import count_vibe_facets, filter_vibes, vibe_facets
+from .search_index import search_index
+from .transactions import write_transaction
+
+
+# Process-local caches, so tests never touch the shared cache file
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'basicSearch-tests',
+    },
+}
+
+
+def create_restaurant(name, **fields):
+    fields.setdefault('address', f'{name} Street')
+    return Restaurant.objects.create(name=name, **fields)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTestCase(TestCase):
+    """Starts every test with empty caches and an unbuilt search index"""
+
+    def setUp(self):
+        caching.cache.clear()
+        search_cache.local.clear()
+        caching._local_generation = (None, 0.0)
+        search_index.is_built = False
+
+    def ingest(self, *records, suffix='.jsonl', **options):
+        """Run ingest_restaurants on a feed file holding records"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / f'feed{suffix}'
+            path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+            call_command('ingest_restaurants', str(path), stdout=StringIO(), stderr=StringIO(), **options)
+
+
+class BackfillMigrationTests(TransactionTestCase):
+    """Rows saved before the denormalized search columns existed"""
+
+    before = [('basicSearch', '0010_restaurant_updated_at_idx')]
+    after = [('basicSearch', '0011_backfill_search_fields')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_search_columns_are_filled(self):
+        apps = self.migrate(self.before)
+        # bulk_create skips save(), like rows written before 0003
+        apps.get_model('basicSearch', 'Restaurant').objects.bulk_create([
+            apps.get_model('basicSearch', 'Restaurant')(
+                name='Café Luna', address='1 Main St', cuisine='Italian', vibes=['cozy'],
+                latitude='40.712800', longitude='-74.006000',
+            ),
+        ])
+        apps = self.migrate(self.after)
+        restaurant = apps.get_model('basicSearch', 'Restaurant').objects.get()
+        self.assertIn('cafe luna', restaurant.search_document)
+        self.assertIn('cozy', restaurant.search_document)
+        self.assertTrue(restaurant.geohash.startswith('dr5r'))
+        self.assertEqual(restaurant.vibes_mask, Restaurant.VIBE_BITS['cozy'])
+
+
+class SQLiteCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SQLiteCache(Path(directory.name) / 'cache.sqlite3', {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+        self.addCleanup(lambda: self.cache._connection().close())
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.delete('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        # add() replaces an expired entry
+        self.assertTrue(self.cache.add('key', 'fresh'))
+        self.assertEqual(self.cache.get('key'), 'fresh')
+
+    def test_incr(self):
+        self.cache.set('counter', 1, timeout=None)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.incr('counter', 10), 12)
+        self.assertEqual(self.cache.get('counter'), 12)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_many(self):
+        self.cache.set_many({f'key{number}': number for number in range(3)})
+        self.assertEqual(self.cache.get_many(['key0', 'key2', 'missing']), {'key0': 0, 'key2': 2})
+
+    def test_cull_drops_entries_closest_to_expiring(self):
+        self.cache.CULL_CHECK_INTERVAL = 1
+        for number in range(25):
+            self.cache.set(f'key{number}', number, timeout=60 + number)
+        self.assertLessEqual(self.cache.entry_count(), 10)
+        self.assertIsNone(self.cache.get('key0'))
+        self.assertEqual(self.cache.get('key24'), 24)
+
+
+@override_settings(SEARCH_EARLY_REFRESH_BETA=0)
+class SearchCacheTests(SearchTestCase):
+
+    key = 'basicSearch-tests:page'
+
+    def compute(self, value):
+        def compute():
+            self.computed.append(value)
+            return value
+        return compute
+
+    def setUp(self):
+        super().setUp()
+        self.computed = []
+
+    def store_stale(self, value):
+        entry = {'value': value, 'fresh_until': time.time() - 1, 'delta': 0.0}
+        search_cache.set(self.key, entry, 60)
+
+    def test_miss_then_hit(self):
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('page'), 60), ('page', False))
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('other'), 60), ('page', True))
+        self.assertEqual(self.computed, ['page'])
+
+    def test_stale_entry_is_served_while_another_worker_refreshes(self):
+        self.store_stale('old')
+        caching.cache.add(f'{self.key}:lock', 'other worker')
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('new'), 60), ('old', True))
+        self.assertEqual(self.computed, [])
+
+        caching.cache.delete(f'{self.key}:lock')
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('new'), 60), ('new', False))
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('newer'), 60), ('new', True))
+        self.assertFalse(caching.cache.has_key(f'{self.key}:lock'))
+
+    def test_newer_shared_entry_replaces_stale_local_copy(self):
+        self.store_stale('old')
+        caching.cache.set(self.key, {'value': 'new', 'fresh_until': time.time() + 60, 'delta': 0.0})
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('mine'), 60), ('new', True))
+        self.assertEqual(self.computed, [])
+
+    @override_settings(SEARCH_LOCK_WAIT=0.1)
+    def test_miss_waits_for_lock_holder_then_computes(self):
+        caching.cache.add(f'{self.key}:lock', 'other worker')
+        self.assertEqual(search_cache.get_or_compute(self.key, self.compute('page'), 60), ('page', False))
+        self.assertEqual(self.computed, ['page'])
+
+
+class AsyncViewTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = create_restaurant('Pizza Palace', cuisine='Italian')
+        for number in range(12):
+            create_restaurant(f'Pizza Place {number}')
+
+    async def test_requests_reach_the_async_views(self):
+        response = await self.async_client.get(reverse('search_restaurants'), {'q': 'pizza'})
+        self.assertIs(response.resolver_match.func, async_views.search_restaurants)
+
+    async def test_search_miss_hit_and_not_modified(self):
+        url = reverse('search_restaurants')
+        miss = await self.async_client.get(url, {'q': 'pizza'})
+        hit = await self.async_client.get(url, {'q': 'pizza'})
+        self.assertFalse(miss.json()['cached'])
+        self.assertTrue(hit.json()['cached'])
+        self.assertEqual(hit.json()['results'], miss.json()['results'])
+        self.assertEqual(len(hit.json()['results']), 13)
+
+        response = await self.async_client.get(url, {'q': 'pizza'}, headers={'If-None-Match': hit['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], hit['ETag'])
+
+    async def test_detail_page(self):
+        url = reverse('restaurant_detail', args=[self.restaurant.pk])
+        first = await self.async_client.get(url)
+        self.assertContains(first, 'Pizza Palace')
+        cached = await self.async_client.get(url)
+        self.assertEqual(cached.content, first.content)
+        response = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_restaurant_batch(self):
+        url = reverse('restaurant_batch')
+        params = {'ids': str(self.restaurant.pk), 'fields': 'name'}
+        first = (await self.async_client.get(url, params)).json()
+        cached = (await self.async_client.get(url, params)).json()
+        self.assertEqual(first['results'], [{'id': str(self.restaurant.pk), 'name': 'Pizza Palace'}])
+        self.assertEqual(cached, first)
+        self.assertIsNotNone(await cache.aget(restaurant_cache_key(self.restaurant.pk, 'default')))
+
+    @override_settings(SEARCH_EXPORT_CHUNK_SIZE=5)
+    async def test_ndjson_export(self):
+        response = await self.async_client.get(reverse('search_restaurants'), {'q': 'pizza', 'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        parts = [part async for part in response.streaming_content]
+        # 13 rows in chunks of 5
+        self.assertEqual(len(parts), 3)
+        lines = b''.join(parts).splitlines()
+        self.assertEqual(len({json.loads(line)['id'] for line in lines}), 13)
+
+    @override_settings(SEARCH_EARLY_REFRESH_BETA=0, SEARCH_LOCK_WAIT=2)
+    async def test_lock_wait_does_not_block_the_event_loop(self):
+        key = 'basicSearch-tests:async-page'
+        await caching.cache.aadd(f'{key}:lock', 'other worker')
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await caching.cache.aset(key, {'value': 'page', 'fresh_until': time.time() + 60, 'delta': 0.0})
+
+        def compute():
+            raise AssertionError('the lock holder computes the page')
+
+        result, _ = await asyncio.gather(search_cache.aget_or_compute(key, compute, 60), other_worker())
+        self.assertEqual(result, ('page', True))
+
+
+class SearchFilterTests(SearchTestCase):
+
+    def search(self, **params):
+        response = self.client.get(reverse('search_restaurants'), params)
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_min_rating_is_rounded_up(self):
+        create_restaurant('Quattro Stagioni', rating='4.8', price_range='$$$$')
+        create_restaurant('Crystal Palace', rating='4.9', price_range='$$$$')
+        self.assertEqual(self.search(price_range='$$$$', min_rating='4.85'), ['Crystal Palace'])
+        self.assertEqual(self.search(price_range='$$$$', min_rating='4.8'), ['Crystal Palace', 'Quattro Stagioni'])
+
+    def test_invalid_min_rating(self):
+        for value in ('5.5', '-1', 'nan', 'inf', 'high'):
+            response = self.client.get(reverse('search_restaurants'), {'min_rating': value})
+            self.assertEqual(response.status_code, 400)
+
+
+class SearchBackendTests(SearchTestCase):
+
+    def search(self, backend, query):
+        # Cached pages are not keyed by backend
+        caching.cache.clear()
+        search_cache.local.clear()
+        with override_settings(SEARCH_BACKEND=backend):
+            response = self.client.get(reverse('search_restaurants'), {'q': query})
+        return sorted(result['name'] for result in response.json()['results'])
+
+    def assertBackendsFind(self, query, names):
+        for backend in ('index', 'fts'):
+            self.assertEqual(self.search(backend, query), names, backend)
+
+    def test_backends_match_the_search_document(self):
+        create_restaurant('Crystal Palace', vibes=['finedining', 'privatedining'])
+        create_restaurant('Quattro Stagioni', cuisine='Fine Dining')
+        cafe = create_restaurant('Café Luna', cuisine='Italian', address='1 Main St')
+        self.assertBackendsFind('fine dining', ['Crystal Palace', 'Quattro Stagioni'])
+        self.assertBackendsFind('private dining', ['Crystal Palace'])
+        self.assertBackendsFind('cafe ital', ['Café Luna'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cafe.name = 'Trattoria Luna'
+            cafe.save()
+        self.assertBackendsFind('cafe', [])
+        self.assertBackendsFind('trattoria', ['Trattoria Luna'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cafe.delete()
+        self.assertBackendsFind('luna', [])
+
+    def test_rolled_back_changes_are_not_indexed(self):
+        palace = create_restaurant('Pizza Palace', address='1 Main St')
+        palace_id = palace.pk.hex
+        search_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    create_restaurant('Pizza Plaza', address='2 Main St')
+                    palace.delete()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(search_index.search('pizza'), {palace_id})
+
+
+class TypeaheadTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_restaurant('Pizza Palace', rating='4.5', vibes=['cozy', 'date'])
+        create_restaurant('Pizza Plaza', rating='4.0', vibes=['cozy'])
+        create_restaurant('Pizzeria Uno', rating='4.5', vibes=['date'])
+        create_restaurant('Piano Bar', rating='3.5', vibes=['bar'])
+        create_restaurant('Sushi Bar', rating='5.0')
+
+    def clear_caches(self):
+        caching.cache.clear()
+        search_cache.local.clear()
+
+    def search(self, query, limit=2):
+        response = self.client.get(reverse('search_restaurants'), {'q': query, 'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        pages = [[result['id'] for result in data['results']]]
+        cursor = data['next_cursor']
+        while cursor:
+            page = self.client.get(reverse('search_restaurants'), {'q': query, 'limit': limit, 'cursor': cursor}).json()
+            pages.append([result['id'] for result in page['results']])
+            cursor = page['next_cursor']
+        return pages, data['facets']
+
+    def test_prefix_answers_match_fresh_searches(self):
+        queries = ['p', 'pi', 'piz', 'pizz', 'pizza', 'pizza p', 'pizza pla']
+        for backend in ('index', 'orm', 'fts'):
+            with override_settings(SEARCH_BACKEND=backend):
+                self.clear_caches()
+                hits = typeahead.stats['hits']
+                typed = [self.search(query) for query in queries]
+                if backend != 'fts':
+                    self.assertEqual(typeahead.stats['hits'] - hits, len(queries) - 1, backend)
+                for query, answer in zip(queries, typed):
+                    self.clear_caches()
+                    self.assertEqual(answer, self.search(query), f'{backend} {query!r}')
+
+    @override_settings(SEARCH_TYPEAHEAD_MAX_RESULTS=2)
+    def test_large_result_sets_are_not_cached(self):
+        stored = typeahead.stats['stored']
+        pages, facets = self.search('pi', limit=1)
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(facets, {'vibes': {'bar': 1, 'cozy': 2, 'date': 2}})
+        self.assertEqual(typeahead.stats['stored'], stored)
+
+        # No cached prefix to filter, so the database answers again
+        misses = typeahead.stats['misses']
+        pages, facets = self.search('piz', limit=1)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(facets, {'vibes': {'cozy': 2, 'date': 2}})
+        self.assertEqual(typeahead.stats['misses'], misses + 1)
+
+        self.search('pizza', limit=1)
+        self.assertEqual(typeahead.stats['stored'], stored + 1)
+
+    @override_settings(SEARCH_TYPEAHEAD_MAX_PREFIXES=3)
+    def test_only_the_longest_prefixes_are_tried(self):
+        self.search('pizz')
+        hits = typeahead.stats['hits']
+        self.search('pizza p')
+        self.assertEqual(typeahead.stats['hits'], hits)
+        # Each keystroke finds the set cached by the previous one
+        for query in ('pizza pl', 'pizza pla', 'pizza plaz', 'pizza plaza'):
+            self.search(query)
+        self.assertEqual(typeahead.stats['hits'], hits + 4)
+
+
+class CursorPaginationTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Ties on rating (and on name) leave the id to order the rows
+        for number, rating in enumerate(['4.5', '4.5', '4.0', '4.5', '3.0', '4.0', '4.5']):
+            create_restaurant('Pizza Place' if number % 2 else f'Pizza Place {number}', rating=rating)
+        create_restaurant('Sushi Bar', rating='5.0')
+
+    def pages(self, backend, **params):
+        caching.cache.clear()
+        search_cache.local.clear()
+        ids = []
+        cursor = ''
+        with override_settings(SEARCH_BACKEND=backend):
+            while True:
+                response = self.client.get(reverse('search_restaurants'), {**params, 'limit': 3, 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                ids.extend(result['id'] for result in data['results'])
+                if not data['has_more']:
+                    return ids
+                cursor = data['next_cursor']
+
+    def test_pages_cover_every_result_once(self):
+        for backend in ('index', 'fts', 'orm'):
+            ids = self.pages(backend, q='pizza')
+            self.assertEqual(len(ids), 7, backend)
+            self.assertEqual(len(set(ids)), 7, backend)
+            self.assertEqual(len(set(self.pages(backend, q='pizza', min_rating='4.5'))), 4, backend)
+
+    def test_default_ordering(self):
+        ids = self.pages('index')
+        names = [Restaurant.objects.get(pk=restaurant_id).name for restaurant_id in ids]
+        self.assertEqual(names[0], 'Sushi Bar')
+        self.assertEqual(len(set(ids)), 8)
+        ratings = [Restaurant.objects.get(pk=restaurant_id).rating for restaurant_id in ids]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('search_restaurants'), {'q': 'pizza', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GeoSearchTests(SearchTestCase):
+
+    lat, lng = 40.7128, -74.006
+
+    def setUp(self):
+        super().setUp()
+        # Due north of the search point, at these distances in km
+        for km in (20, 0.5, 5, 1, 2):
+            create_restaurant(f'{km} km', latitude=f'{self.lat + km / KM_PER_DEGREE:.6f}', longitude=str(self.lng))
+        create_restaurant('Nowhere')
+
+    def near(self, **params):
+        response = self.client.get(reverse('search_restaurants'), {'lat': self.lat, 'lng': self.lng, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertTrue(Restaurant.objects.get(name='1 km').geohash.startswith(encode_geohash(self.lat, self.lng, 4)))
+
+    def test_k_nearest_pages(self):
+        first = self.near(limit=2)
+        self.assertEqual([result['name'] for result in first['results']], ['0.5 km', '1 km'])
+        second = self.near(limit=2, cursor=first['next_cursor'])
+        self.assertEqual([result['name'] for result in second['results']], ['2 km', '5 km'])
+        third = self.near(limit=2, cursor=second['next_cursor'])
+        self.assertEqual([result['name'] for result in third['results']], ['20 km'])
+        self.assertFalse(third['has_more'])
+
+    def test_radius(self):
+        data = self.near(radius=3)
+        self.assertEqual([result['name'] for result in data['results']], ['0.5 km', '1 km', '2 km'])
+        self.assertEqual(self.near(radius=0.1)['results'], [])
+
+
+class OpeningHoursTests(SearchTestCase):
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time('5:00 PM'), 17 * 60)
+        self.assertEqual(parse_time('12:00 AM'), 0)
+        self.assertEqual(parse_time('12 pm'), 12 * 60)
+        self.assertEqual(parse_time('17:30'), 17 * 60 + 30)
+        self.assertIsNone(parse_time('13:00 PM'))
+        self.assertIsNone(parse_time('late'))
+
+    def test_ranges_past_midnight_are_split(self):
+        self.assertEqual(opening_intervals({'friday': '5:00 PM - 2:00 AM'}), [(4, 1020, 1440), (5, 0, 120)])
+        # Sunday night runs into Monday
+        self.assertEqual(opening_intervals({'sunday': '10 PM - 1 AM'}), [(6, 1320, 1440), (0, 0, 60)])
+        # Closing at midnight adds nothing to the next day
+        self.assertEqual(
+            opening_intervals({'monday': '11:00 AM - 2:00 PM, 5:00 PM - 12:00 AM'}),
+            [(0, 660, 840), (0, 1020, 1440)],
+        )
+        self.assertEqual(opening_intervals({'tuesday': 'Closed', 'wednesday': 'Open 24 hours'}), [(2, 0, 1440)])
+
+    def test_open_at(self):
+        create_restaurant('Night Owl', operating_hours={'friday': '5:00 PM - 2:00 AM'})
+        create_restaurant('Lunch Spot', operating_hours={'saturday': '11:00 AM - 3:00 PM'})
+
+        def open_at(moment):
+            response = self.client.get(reverse('search_restaurants'), {'open_at': moment})
+            return [result['name'] for result in response.json()['results']]
+
+        # 2025-09-05 is a Friday
+        self.assertEqual(open_at('2025-09-05T23:00'), ['Night Owl'])
+        self.assertEqual(open_at('2025-09-06T01:30'), ['Night Owl'])
+        self.assertEqual(open_at('2025-09-06T02:00'), [])
+        self.assertEqual(open_at('2025-09-06T12:00'), ['Lunch Spot'])
+
+
+class VibeTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_restaurant('Cozy Date', vibes=['cozy', 'date'])
+        create_restaurant('Cozy Patio', vibes=['cozy', 'patio'])
+        create_restaurant('Rooftop Bar', vibes=['rooftop', 'bar', 'date'])
+        create_restaurant('Plain')
+
+    def search(self, **params):
+        response = self.client.get(reverse('search_restaurants'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return sorted(result['name'] for result in data['results']), data['facets']['vibes']
+
+    def test_all_and_any(self):
+        self.assertEqual(self.search(vibes='cozy,date')[0], ['Cozy Date'])
+        self.assertEqual(self.search(vibes=['cozy', 'date'], vibes_match='any')[0],
+                         ['Cozy Date', 'Cozy Patio', 'Rooftop Bar'])
+        self.assertEqual(self.search(vibes='patio,rooftop')[0], [])
+
+    def test_invalid_vibes(self):
+        for params in ({'vibes': 'cozy,haunted'}, {'vibes': 'cozy', 'vibes_match': 'some'}):
+            response = self.client.get(reverse('search_restaurants'), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_facets(self):
+        names, facets = self.search()
+        self.assertEqual(facets, {'bar': 1, 'cozy': 2, 'date': 2, 'patio': 1, 'rooftop': 1})
+        # Counted over the filtered results
+        self.assertEqual(self.search(vibes='date')[1], {'bar': 1, 'cozy': 1, 'date': 2, 'rooftop': 1})
+
+    def test_database_and_memory_counts_agree(self):
+        restaurants = Restaurant.objects.all()
+        masks = restaurants.values_list('vibes_mask', flat=True)
+        self.assertEqual(vibe_facets(restaurants), count_vibe_facets(masks))
+        subset = filter_vibes(restaurants, ['cozy', 'rooftop'], match_all=False)
+        self.assertEqual(vibe_facets(subset), count_vibe_facets(subset.values_list('vibes_mask', flat=True)))
+        self.assertEqual(vibe_facets(restaurants.none()), count_vibe_facets([]))
+
+
+class ConditionalGetTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = create_restaurant('Pizza Palace', cuisine='Italian')
+        for number in range(20):
+            create_restaurant(f'Pizza Place {number}')
+
+    def assertRevalidates(self, url, params):
+        for encoding in ('gzip', 'identity'):
+            first = self.client.get(url, params, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(first['ETag'].startswith('W/"'))
+            response = self.client.get(url, params, HTTP_ACCEPT_ENCODING=encoding, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertEqual(response['Cache-Control'], first['Cache-Control'])
+            response = self.client.get(url, params, HTTP_ACCEPT_ENCODING=encoding,
+                                       HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH='W/"outdated"')
+        self.assertEqual(response.status_code, 200)
+        return first
+
+    def test_search(self):
+        response = self.assertRevalidates(reverse('search_restaurants'), {'q': 'pizza'})
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, stale-while-revalidate=30')
+
+    def test_detail(self):
+        url = reverse('restaurant_detail', args=[self.restaurant.pk])
+        response = self.assertRevalidates(url, {})
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60, stale-while-revalidate=300')
+
+    def test_save_changes_the_validators(self):
+        url = reverse('restaurant_detail', args=[self.restaurant.pk])
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.name = 'Pizza Plaza'
+            self.restaurant.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+@ignore_warnings(message='Overriding setting DATABASES')
+class SearchDatabaseRoutingTests(TestCase):
+    """Routing with a search database configured (SEARCH_DATABASE set)"""
+
+    def setUp(self):
+        databases = {**settings.DATABASES, SEARCH_DATABASE: {**settings.DATABASES['default']}}
+        override = override_settings(DATABASES=databases)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.router = SearchRouter()
+
+    def routed(self, request):
+        @reads_search_database
+        def view(request):
+            return read_database(), Restaurant.objects.all().db, User.objects.all().db
+
+        return view(request)
+
+    def test_reads_go_to_the_search_database(self):
+        request = RequestFactory().get('/search/')
+        self.assertEqual(self.routed(request), (SEARCH_DATABASE, SEARCH_DATABASE, 'default'))
+        # Outside the wrapped views
+        self.assertEqual(Restaurant.objects.all().db, 'default')
+
+    def test_writes_and_migrations_go_to_default(self):
+        self.assertEqual(self.router.db_for_write(Restaurant), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'basicSearch'))
+        self.assertFalse(self.router.allow_migrate(SEARCH_DATABASE, 'basicSearch'))
+
+    def test_writes_make_the_client_read_the_primary(self):
+        def write(request):
+            create_restaurant('Pizza Palace')
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(write)
+        cookie = middleware(RequestFactory().post('/admin/')).cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.SEARCH_DATABASE_STICKY_SECONDS)
+
+        request = RequestFactory().get('/search/')
+        request.COOKIES[STICKY_COOKIE] = cookie.value
+        self.assertEqual(self.routed(request)[0], 'default')
+        # Once the window has passed
+        with mock.patch('basicSearch.routers.time.time', return_value=float(cookie.value) + 1):
+            self.assertEqual(self.routed(request)[0], SEARCH_DATABASE)
+
+    def test_reads_set_no_cookie(self):
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(Restaurant.objects.count()))
+        self.assertNotIn(STICKY_COOKIE, middleware(RequestFactory().get('/search/')).cookies)
+
+
+class DetailPageTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = create_restaurant(
+            'Pizza Palace', address='1 Main St', operating_hours={'monday': '11:00 AM - 10:00 PM'},
+        )
+        self.url = reverse('restaurant_detail', args=[self.restaurant.pk])
+
+    def test_page_is_cached(self):
+        self.assertContains(self.client.get(self.url), 'Pizza Palace')
+        self.assertIsNotNone(search_cache.get(detail_cache_key(self.restaurant.pk)))
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(self.url), '11:00 AM - 10:00 PM')
+
+    def test_save_invalidates_the_cached_page(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.name = 'Pizza Plaza'
+            self.restaurant.save()
+        self.assertIsNone(search_cache.get(detail_cache_key(self.restaurant.pk)))
+        self.assertContains(self.client.get(self.url), 'Pizza Plaza')
+
+    def test_entry_from_an_older_version_is_not_served(self):
+        # Saved by another process: this one's cached entry is still there
+        self.client.get(self.url)
+        self.restaurant.name = 'Pizza Plaza'
+        self.restaurant.save()
+        self.assertIsNotNone(search_cache.get(detail_cache_key(self.restaurant.pk)))
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Pizza Plaza')
+        self.assertNotContains(response, 'Pizza Palace')
+
+
+class CompressionTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(20):
+            create_restaurant(f'Pizza Place {number}', cuisine='Italian')
+
+    def test_search_page_miss_then_hit(self):
+        url = reverse('search_restaurants')
+        miss = self.client.get(url, {'q': 'pizza'}, HTTP_ACCEPT_ENCODING='gzip')
+        hit = self.client.get(url, {'q': 'pizza'}, HTTP_ACCEPT_ENCODING='gzip')
+        for response, cached in ((miss, False), (hit, True)):
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            data = json.loads(gzip.decompress(response.content))
+            self.assertEqual(data['cached'], cached)
+            self.assertEqual(len(data['results']), 20)
+        identity = self.client.get(url, {'q': 'pizza'})
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(identity.content)['results'], data['results'])
+
+    @override_settings(SEARCH_EXPORT_CHUNK_SIZE=8)
+    def test_ndjson_export_is_written_per_chunk(self):
+        response = self.client.get(reverse('search_restaurants'), {'format': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        # 3 chunks of rows (8 + 8 + 4) and the end of the gzip stream
+        parts = list(response.streaming_content)
+        self.assertEqual(len(parts), 4)
+        lines = gzip.decompress(b''.join(parts)).splitlines()
+        self.assertEqual(len({json.loads(line)['id'] for line in lines}), 20)
+
+    def test_other_pages_use_gzip_middleware(self):
+        # GZipMiddleware pads its output against BREACH, so the same page
+        # compresses differently every time
+        first = self.client.get(reverse('index'), HTTP_ACCEPT_ENCODING='gzip')
+        second = self.client.get(reverse('index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.content), gzip.decompress(second.content))
+        self.assertNotEqual(first.content, second.content)
+
+
+class WriteTransactionTests(TransactionTestCase):
+
+    def begins(self, block):
+        with CaptureQueriesContext(connection) as queries:
+            with block():
+                Restaurant.objects.count()
+        return [query['sql'] for query in queries if query['sql'].startswith(('BEGIN', 'SAVEPOINT'))]
+
+    def test_only_write_transactions_take_the_write_lock(self):
+        self.assertEqual(self.begins(write_transaction), ['BEGIN IMMEDIATE'])
+        mode = connection.transaction_mode
+        self.assertEqual(self.begins(transaction.atomic), [f'BEGIN {mode}' if mode else 'BEGIN'])
+        self.assertNotEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_nested_block_is_a_savepoint(self):
+        with transaction.atomic():
+            begins = self.begins(write_transaction)
+        self.assertEqual(len(begins), 1)
+        self.assertTrue(begins[0].startswith('SAVEPOINT'))
+
+
+class IngestTests(SearchTestCase):
+
+    def test_inserts_and_updates_by_place_id(self):
+        self.ingest(
+            {'place_id': 'place-1', 'name': 'Pizza Palace', 'address': '1 Main St', 'cuisine': 'Italian',
+             'operating_hours': {'monday': '11:00 AM - 10:00 PM'}},
+            {'place_id': 'place-2', 'name': 'Sushi Express', 'address': '2 Main St'},
+        )
+        restaurant = Restaurant.objects.get(place_id='place-1')
+        self.assertIn('italian', restaurant.search_document)
+        self.assertEqual(restaurant.opening_intervals.count(), 1)
+
+        self.ingest({'place_id': 'place-1', 'name': 'Pizza Plaza', 'address': '1 Main St', 'cuisine': 'Pizza'})
+        updated = Restaurant.objects.get(place_id='place-1')
+        self.assertEqual(updated.pk, restaurant.pk)
+        self.assertEqual((updated.name, updated.cuisine), ('Pizza Plaza', 'Pizza'))
+        self.assertIn('pizza plaza', updated.search_document)
+        self.assertEqual(Restaurant.objects.count(), 2)
+
+    def test_partial_record_keeps_other_fields(self):
+        self.ingest({
+            'place_id': 'place-1', 'name': 'Pizza Palace', 'address': '1 Main St', 'cuisine': 'Italian',
+            'images': ['https://example.com/1.jpg'], 'operating_hours': {'monday': '11:00 AM - 10:00 PM'},
+        })
+        self.ingest({'place_id': 'place-1', 'name': 'Renamed By Feed'})
+        restaurant = Restaurant.objects.get(place_id='place-1')
+        self.assertEqual(restaurant.name, 'Renamed By Feed')
+        self.assertEqual(restaurant.cuisine, 'Italian')
+        self.assertEqual(restaurant.images, ['https://example.com/1.jpg'])
+        self.assertIn('italian', restaurant.search_document)
+        self.assertEqual(OpeningInterval.objects.filter(restaurant=restaurant).count(), 1)
+
+    def test_delete_record(self):
+        self.ingest({'place_id': 'place-1', 'name': 'Pizza Palace', 'address': '1 Main St'})
+        self.ingest({'place_id': 'place-1', 'deleted': True})
+        self.assertFalse(Restaurant.objects.exists())
+
+    def test_invalid_records_are_skipped(self):
+        self.ingest(
+            {'name': 'No Place Id', 'address': '1 Main St'},
+            {'place_id': 'place-1', 'name': 'Bad Rating', 'address': '1 Main St', 'rating': 'high'},
+            {'place_id': 'place-2', 'name': 'Good', 'address': '2 Main St'},
+        )
+        self.assertEqual(list(Restaurant.objects.values_list('name', flat=True)), ['Good'])
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            call_command('ingest_restaurants', 'feed.jsonl', batch_size=0)
+
+
+class IncrementalSyncTests(SearchTestCase):
+    """
+    Changes made by another process: without captureOnCommitCallbacks the
+    signal handlers never update this process's index.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = create_restaurant('Pizza Palace', address='1 Main St')
+        self.other = create_restaurant('Sushi Express', address='2 Main St')
+        search_index.build(generation=1)
+
+    def test_sync_applies_updates(self):
+        self.restaurant.name = 'Trattoria Roma'
+        self.restaurant.save()
+        self.assertEqual(search_index.search('trattoria'), set())
+        search_index.sync(generation=2)
+        self.assertEqual(search_index.search('trattoria'), {self.restaurant.pk.hex})
+        self.assertEqual(search_index.search('pizza'), set())
+        self.assertEqual(len(search_index), 2)
+
+    def test_sync_applies_deletes_from_tombstones(self):
+        restaurant_id = self.restaurant.pk
+        self.restaurant.delete()
+        self.assertTrue(RestaurantTombstone.objects.filter(restaurant_id=restaurant_id).exists())
+        search_index.sync(generation=2)
+        self.assertEqual(search_index.search('pizza'), set())
+        self.assertEqual(len(search_index), 1)
+
+    @override_settings(SEARCH_SYNC_OVERLAP=0)
+    def test_row_at_the_watermark_is_read_once(self):
+        watermark = search_index.synced_at
+        self.restaurant.name = 'Trattoria Roma'
+        self.restaurant.refresh_search_fields()
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(
+            name=self.restaurant.name, search_document=self.restaurant.search_document, updated_at=watermark,
+        )
+        search_index.sync(generation=2)
+        self.assertEqual(search_index.search('trattoria'), {self.restaurant.pk.hex})
+        self.assertEqual(len(search_index), 2)
+
+    def test_incremental_ingest_watermark(self):
+        self.ingest(
+            {'place_id': 'place-1', 'name': 'First', 'address': '1 Feed St', 'updated_at': '2025-09-01T10:00:00Z'},
+            {'place_id': 'place-2', 'name': 'Second', 'address': '2 Feed St', 'updated_at': '2025-09-02T10:00:00Z'},
+            incremental=True,
+        )
+        self.ingest(
+            # Older than the watermark: skipped
+            {'place_id': 'place-1', 'name': 'Stale', 'address': '1 Feed St', 'updated_at': '2025-09-01T12:00:00Z'},
+            # At the watermark: not seen by the previous run
+            {'place_id': 'place-3', 'name': 'Third', 'address': '3 Feed St', 'updated_at': '2025-09-02T10:00:00Z'},
+            incremental=True,
+        )
+        names = Restaurant.objects.filter(place_id__startswith='place-').order_by('place_id')
+        self.assertEqual(list(names.values_list('name', flat=True)), ['First', 'Second', 'Third'])
+
+
+class RestaurantBatchTests(SearchTestCase):
+
+    def batch(self, *restaurants, fields='name'):
+        response = self.client.get(reverse('restaurant_batch'), {
+            'ids': ','.join(str(restaurant.pk) for restaurant in restaurants),
+            'fields': fields,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_in_request_order(self):
+        first = create_restaurant('First')
+        second = create_restaurant('Second')
+        data = self.batch(second, first)
+        self.assertEqual(data['results'], [
+            {'id': str(second.pk), 'name': 'Second'},
+            {'id': str(first.pk), 'name': 'First'},
+        ])
+        self.assertEqual(data['missing'], [])
+
+    def test_only_missing_ids_are_queried(self):
+        # One query validates the cached entries, one reads the others
+        first = create_restaurant('First')
+        second = create_restaurant('Second')
+        with self.assertNumQueries(2):
+            self.batch(first)
+        with self.assertNumQueries(1):
+            self.batch(first)
+        with self.assertNumQueries(2):
+            data = self.batch(first, second)
+        self.assertEqual([result['name'] for result in data['results']], ['First', 'Second'])
+
+    def test_save_keeps_other_entries(self):
+        first = create_restaurant('First')
+        second = create_restaurant('Second')
+        self.batch(first)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.name = 'Second Renamed'
+            second.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.batch(first)['results'][0]['name'], 'First')
+
+    def test_entry_checked_against_updated_at(self):
+        # A write that sent no signal, as from another process before its commit hook ran
+        restaurant = create_restaurant('Pizza Palace')
+        self.batch(restaurant)
+        Restaurant.objects.filter(pk=restaurant.pk).update(name='Pizza Plaza', updated_at=timezone.now())
+        self.assertEqual(self.batch(restaurant)['results'][0]['name'], 'Pizza Plaza')
+
+    def test_deleted_restaurant_is_missing(self):
+        restaurant = create_restaurant('Pizza Palace')
+        restaurant_id = restaurant.pk
+        self.batch(restaurant)
+        # The delete's commit hook does not run, the entry stays
+        restaurant.delete()
+        data = self.client.get(reverse('restaurant_batch'), {'ids': str(restaurant_id)}).json()
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['missing'], [str(restaurant_id)])
+
+    def test_save_retires_cached_entry(self):
+        restaurant = create_restaurant('Pizza Palace')
+        self.batch(restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            restaurant.name = 'Pizza Plaza'
+            restaurant.save()
+        self.assertEqual(self.batch(restaurant)['results'][0]['name'], 'Pizza Plaza')
+
+    def test_ingest_retires_cached_entry(self):
+        # bulk upserts send no signals
+        restaurant = create_restaurant('Pizza Palace', place_id='place-1')
+        self.assertEqual(self.batch(restaurant)['results'][0]['name'], 'Pizza Palace')
+        key = restaurant_cache_key(restaurant.pk, 'default')
+        self.assertIsNotNone(cache.get(key))
+        self.ingest({'place_id': 'place-1', 'name': 'Renamed By Feed', 'address': '1 Feed St'})
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.batch(restaurant)['results'][0]['name'], 'Renamed By Feed')
+
+    def test_invalid_requests(self):
+        restaurant = create_restaurant('First')
+        url = reverse('restaurant_batch')
+        for params in ({}, {'ids': 'not-a-uuid'}, {'ids': str(restaurant.pk), 'fields': 'search_document'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
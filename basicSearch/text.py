@@ -0,0 +1,34 @@
+import re
+import unicodedata
+
+
+TOKEN_RE = re.compile(r'\w+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Lowercase, accent-folded text with collapsed whitespace ("Café  Luna" -> "cafe luna")"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return WHITESPACE_RE.sub(' ', folded.lower()).strip()
+
+
+def tokenize(text):
+    """Split text into normalized word tokens"""
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def build_search_document(restaurant, vibe_labels):
+    """
+    Denormalized text searched for a restaurant: name, cuisine, address,
+    neighbourhood and its vibes (both the choice and its display label).
+    """
+    parts = [restaurant.name, restaurant.cuisine, restaurant.address, restaurant.neighbourhood]
+    for vibe in restaurant.vibes or []:
+        parts.append(vibe)
+        label = vibe_labels.get(vibe)
+        if label and label != vibe:
+            parts.append(label)
+    return ' | '.join(normalize_text(part) for part in parts if part)
@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def write_transaction(using=None):
+    """
+    transaction.atomic() that takes SQLite's write lock when it begins.
+
+    The 'production' profile starts transactions DEFERRED, so read-only ones
+    never hold the write lock. A transaction that reads and then writes
+    cannot wait for the lock at its first write: another writer committing
+    in between fails it with "database is locked". Starting it IMMEDIATE
+    makes it wait (up to the connection timeout) before reading instead.
+    Nested blocks are savepoints of the outer transaction and left alone.
+    """
+    connection = transaction.get_connection(using)
+    immediate = connection.vendor == 'sqlite' and not connection.in_atomic_block
+    if not immediate:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            # BEGIN has run; later transactions get the configured mode
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
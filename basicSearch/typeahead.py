@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import search_cache, search_cache_key
+from .pagination import encode_cursor, paginate, sort_key
+from .routers import read_database
+from .search import DEFAULT_ORDERING, is_relevance_ranked, matches_document, project_results, serialize_result
+from .text import normalize_text
+
+
+# Per-process counters reported by the cache stats endpoint
+stats = {'hits': 0, 'misses': 0, 'stored': 0}
+
+
+def is_supported(query, filters, cursor):
+    """
+    Typeahead answers first pages of non-empty, unfiltered queries. Results
+    ranked by relevance depend on the whole query, so they cannot be derived
+    from a shorter one.
+    """
+    return bool(normalize_text(query)) and not filters and not cursor and not is_relevance_ranked()
+
+
+def _key(generation, prefix):
+    # Result sets read from the search copy and from the primary differ
+    return search_cache_key(generation, 'typeahead', read_database(), prefix)
+
+
+def lookup(generation, query):
+    """
+    (prefix, rows) of the longest already cached prefix of query (among its
+    SEARCH_TYPEAHEAD_MAX_PREFIXES longest), rows being its complete result
+    set as (search_document, sort_key, result, vibes_mask) tuples; None
+    when no prefix is cached.
+
+    Every result of a query is also a result of all its prefixes (with
+    word-prefix or substring matching), so filtering a complete prefix set
+    gives the exact result set of the longer query.
+    """
+    normalized = normalize_text(query)
+    # Every prefix costs a key hashing it, so only the longest ones are tried
+    shortest = max(len(normalized) - settings.SEARCH_TYPEAHEAD_MAX_PREFIXES, 0)
+    prefixes = [normalized[:end] for end in range(len(normalized), shortest, -1)]
+    keys = [_key(generation, prefix) for prefix in prefixes]
+
+    for prefix, key in zip(prefixes, keys):
+        rows = search_cache.local.get(key)
+        if rows is not None:
+            stats['hits'] += 1
+            return prefix, rows
+
+    # One round trip to the shared cache for every prefix
+    found = cache.get_many(keys)
+    for prefix, key in zip(prefixes, keys):
+        if key in found:
+            search_cache.local.set(key, found[key], settings.SEARCH_L1_TIMEOUT)
+            stats['hits'] += 1
+            return prefix, found[key]
+
+    stats['misses'] += 1
+    return None
+
+
+def fetch(restaurants, generation, query, limit):
+    """
+    Fetch the first page of a query from the database.
+
+    Up to SEARCH_TYPEAHEAD_MAX_RESULTS rows are read; when that is the whole
+    result set it is cached for the longer queries typed next. Returns
+    (rows, page, next_cursor), rows being None when the set was too large.
+    """
+    max_results = max(settings.SEARCH_TYPEAHEAD_MAX_RESULTS, limit)
+    batch, more = paginate(project_results(restaurants, 'search_document', 'vibes_mask'), DEFAULT_ORDERING, max_results)
+    if more is None:
+        rows = [
+            (row['search_document'], sort_key(row, DEFAULT_ORDERING), serialize_result(row), row['vibes_mask'])
+            for row in batch
+        ]
+        search_cache.set(_key(generation, normalize_text(query)), rows, timeout=settings.SEARCH_CACHE_TIMEOUT)
+        stats['stored'] += 1
+        page, next_cursor = paginate_rows(rows, limit)
+        return rows, page, next_cursor
+
+    page = [serialize_result(row) for row in batch[:limit]]
+    next_cursor = encode_cursor(sort_key(batch[limit - 1], DEFAULT_ORDERING)) if len(batch) > limit else None
+    return None, page, next_cursor
+
+
+def filter_rows(rows, query):
+    """Narrow a cached prefix result set down to the results of query"""
+    return [row for row in rows if matches_document(query, row[0])]
+
+
+def narrow(generation, query, prefix, rows):
+    """
+    Result set of query from the rows of a prefix found by lookup(). It is
+    cached under query too, so the next keystrokes find it among their
+    longest prefixes.
+    """
+    normalized = normalize_text(query)
+    if prefix == normalized:
+        return rows
+    rows = filter_rows(rows, query)
+    search_cache.set(_key(generation, normalized), rows, timeout=settings.SEARCH_CACHE_TIMEOUT)
+    stats['stored'] += 1
+    return rows
+
+
+def paginate_rows(rows, limit):
+    """First page of an in-memory result set, with a cursor compatible with SQL pagination"""
+    page = [row[2] for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1][1]) if len(rows) > limit else None
+    return page, next_cursor
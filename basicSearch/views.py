@@ -1,101 +1,541 @@
+import hashlib
+import math
+import uuid
+
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
-from django.core.cache import cache
 from django.conf import settings
-from .models import Restaurant
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from datetime import datetime
+from .caching import (
+    bump_generation, describe_cache, detail_cache_key, get_generation, restaurant_cache_key, search_cache,
+    search_cache_key,
+)
+from .compression import (
+    MIN_COMPRESS_SIZE, accepted_encoding, available_encodings, compress, compress_page, compress_tails,
+    encoded_variants, set_content_encoding,
+)
+from .conditional import conditional_response
+from .encoding import dumps
+from .hours import week_position
+from .models import Restaurant, RestaurantTombstone
+from .pagination import InvalidCursor, apply_cursor, paginate
+from .routers import read_database, reads_search_database
+from .search import (
+    DEFAULT_RESTAURANT_FIELDS, RESTAURANT_COLUMNS, RESTAURANT_FIELDS, count_vibe_facets, filter_attributes,
+    filter_near, filter_open_at, filter_restaurants, filter_vibes, project_results, restrict_to_ids,
+    result_ordering, serialize_restaurant, serialize_result, vibe_facets,
+)
+from .sync import FULL_REINDEX, get_watermark
+from . import typeahead
+
+
+def _parse_limit(value):
+    """Validate the page size requested by the client"""
+    if not value:
+        return settings.SEARCH_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, settings.SEARCH_MAX_PAGE_SIZE)
+
+
+def _parse_list(params, name):
+    """Values of a comma separated and/or repeated parameter, deduplicated and sorted"""
+    return sorted({value.strip() for param in params.getlist(name) for value in param.split(',') if value.strip()})
+
+
+def _parse_filters(params):
+    """
+    Validate the optional structured search parameters.
+    
+    The result is normalized (sorted, deduplicated, rounded) since it is
+    part of the cache key.
+    """
+    filters = {}
+    
+    # Attribute filters: any of the listed values matches
+    choices = {
+        'price_range': dict(Restaurant._meta.get_field('price_range').choices),
+        'reservation_partner': dict(Restaurant.RESERVATION_PARTNERS),
+        'cuisine': None,
+    }
+    for name, allowed in choices.items():
+        values = _parse_list(params, name)
+        if allowed is not None and not set(values) <= allowed.keys():
+            raise ValueError(f'unknown {name}')
+        if values:
+            filters[name] = values
+    
+    if params.get('min_rating'):
+        min_rating = float(params['min_rating'])
+        if not 0 <= min_rating <= 5:
+            raise ValueError('min_rating out of range')
+        # Ratings have one decimal: round the threshold up, never below what
+        # was asked (4.85 keeps 4.9 and drops 4.8); round() first drops the
+        # float error of the multiplication (4.8 * 10 = 48.00000000000001)
+        filters['min_rating'] = math.ceil(round(min_rating * 10, 6)) / 10
+    
+    # Location search: lat/lng, with an optional radius in km
+    if 'lat' in params or 'lng' in params:
+        lat = float(params['lat'])
+        lng = float(params['lng'])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('lat/lng out of range')
+        radius = float(params['radius']) if params.get('radius') else None
+        if radius is not None and not 0 < radius <= settings.SEARCH_GEO_MAX_RADIUS_KM:
+            raise ValueError('radius out of range')
+        filters['near'] = {'lat': round(lat, 6), 'lng': round(lng, 6), 'radius': radius}
+    
+    # Opening hours, in the local time zone: open_at=<ISO datetime> or open_now=1
+    moment = None
+    if params.get('open_at'):
+        moment = datetime.fromisoformat(params['open_at'])
+        if timezone.is_aware(moment):
+            moment = timezone.localtime(moment)
+    elif params.get('open_now', '').lower() in ('1', 'true'):
+        moment = timezone.localtime()
+    if moment is not None:
+        day, minute = week_position(moment)
+        filters['open_at'] = {'day': day, 'minute': minute}
+    
+    # Vibes: all of them must match unless vibes_match=any
+    vibes = _parse_list(params, 'vibes')
+    if vibes:
+        if not set(vibes) <= Restaurant.VIBE_BITS.keys():
+            raise ValueError('unknown vibe')
+        match = params.get('vibes_match', 'all')
+        if match not in ('all', 'any'):
+            raise ValueError('vibes_match must be all or any')
+        filters['vibes'] = {'values': vibes, 'match': match}
+    
+    return filters
+
+
+def _parse_search(params):
+    """
+    (query, cursor, limit, filters, format) of a search request; raises
+    ValueError with the message for the client on invalid parameters
+    """
+    try:
+        limit = _parse_limit(params.get('limit'))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    try:
+        filters = _parse_filters(params)
+    except (KeyError, ValueError):
+        raise ValueError('Invalid search parameters')
+    output_format = params.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        raise ValueError('Invalid format')
+    return params.get('q', ''), params.get('cursor', ''), limit, filters, output_format
+
+
+def _search_page(query, filters, limit, cursor, generation):
+    """Run a search and serialize one page of results for the cache"""
+    if typeahead.is_supported(query, filters, cursor):
+        # Filter the cached complete result set of a shorter prefix in memory
+        found = typeahead.lookup(generation, query)
+        if found is not None:
+            rows = typeahead.narrow(generation, query, *found)
+            results, next_cursor = typeahead.paginate_rows(rows, limit)
+        else:
+            restaurants = filter_restaurants(Restaurant.objects.all(), query, generation)
+            rows, results, next_cursor = typeahead.fetch(restaurants, generation, query, limit)
+        if rows is not None:
+            facets = count_vibe_facets(row[3] for row in rows)
+        else:
+            facets = vibe_facets(restaurants)
+        return {
+            'results': results,
+            'count': len(results),
+            'next_cursor': next_cursor,
+            'facets': {'vibes': facets},
+        }
+    
+    restaurants, facets_source = _search_queryset(query, filters, limit, cursor, generation)
+    
+    # Fetch only the requested page (LIMIT in SQL, keyset on the ordering)
+    page, next_cursor = paginate(project_results(restaurants), result_ordering(restaurants), limit, cursor)
+    
+    # Convert to JSON-serializable format for search results
+    results = [serialize_result(row) for row in page]
+    data = {
+        'results': results,
+        'count': len(results),
+        'next_cursor': next_cursor
+    }
+    if not cursor:
+        data['facets'] = {'vibes': vibe_facets(facets_source)}
+    return data
+
+
+def _search_queryset(query, filters, limit, cursor, generation):
+    """
+    Restaurants matching a search, and the queryset its facets are counted
+    on. limit and cursor only bound nearest-first searches; None for limit
+    keeps every match.
+    """
+    # Start with all restaurants
+    restaurants = Restaurant.objects.all()
+    
+    # Apply search filter if query provided
+    restaurants = filter_restaurants(restaurants, query, generation)
+    
+    # Structured filters (indexed columns, then the vibes bitmask)
+    restaurants = filter_attributes(restaurants, filters)
+    if 'open_at' in filters:
+        restaurants = filter_open_at(restaurants, filters['open_at']['day'], filters['open_at']['minute'])
+    if 'vibes' in filters:
+        restaurants = filter_vibes(restaurants, filters['vibes']['values'], filters['vibes']['match'] == 'all')
+    
+    # Facet counts cover the whole result set and are only computed for the
+    # first page. A nearest-first search has no bounded result set; its
+    # facets count everything it draws from.
+    facets_source = restaurants
+    
+    # Location search, sorted by distance
+    if 'near' in filters:
+        restaurants = filter_near(restaurants, filters['near'], limit, cursor)
+        if filters['near']['radius'] is not None:
+            facets_source = restaurants
+    
+    return restaurants, facets_source
+
+
+def _export_rows(query, filters, cursor, generation):
+    """Ordered result rows of a search after cursor, for the NDJSON export"""
+    restaurants, facets_source = _search_queryset(query, filters, None, cursor, generation)
+    ordering = result_ordering(restaurants)
+    # Applied here so an invalid cursor fails before streaming starts. The
+    # rows are read after the view returns, so the database is bound now.
+    rows = project_results(restaurants).order_by(*ordering).using(read_database())
+    return apply_cursor(rows, ordering, cursor)
+
+
+def _ndjson(rows):
+    """NDJSON lines of a batch of project_results() rows, as one chunk"""
+    return b''.join([dumps(serialize_result(row)) + b'\n' for row in rows])
+
+
+def _export_results(query, filters, cursor, generation):
+    """
+    Stream every result of a search (after cursor) as NDJSON, one result
+    object per line. Rows are read in chunks, so memory stays flat whatever
+    the size of the result set.
+    """
+    rows = _export_rows(query, filters, cursor, generation)
+    chunk_size = settings.SEARCH_EXPORT_CHUNK_SIZE
+
+    def chunks():
+        # One write (and one compressor flush) per database chunk, not per row
+        batch = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield _ndjson(batch)
+                batch = []
+        if batch:
+            yield _ndjson(batch)
+
+    return StreamingHttpResponse(chunks(), content_type='application/x-ndjson')
+
+
+def _encode_page(page, encoding):
+    """
+    Encode a search page as the body of a cache hit, in every content coding
+    (see encoded_variants). Hits are served from these bytes without any JSON
+    encoding or compression.
+
+    Also returns (body, encoding) of the response of the request computing
+    the page, which says "cached": false; its compression shares the work of
+    the cached body in the same coding.
+    """
+    data = {
+        'success': True,
+        'results': page['results'],
+        'count': page['count'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['next_cursor'] is not None,
+    }
+    if 'facets' in page:
+        data['facets'] = page['facets']
+    body = dumps(data)
+    head = body[:body.rindex(b'}')]
+    variants = {None: head + CACHED_SUFFIX[True]}
+    fresh = (head + CACHED_SUFFIX[False], None)
+    if len(variants[None]) >= MIN_COMPRESS_SIZE:
+        for available in available_encodings():
+            if available == encoding:
+                variants[available], fresh_body = compress_tails(
+                    head, (CACHED_SUFFIX[True], CACHED_SUFFIX[False]), available,
+                )
+                fresh = (fresh_body, available)
+            else:
+                variants[available] = compress(variants[None], available)
+    return variants, fresh
+
+
+# Closing of an encoded page, by whether it came from the cache
+CACHED_SUFFIX = {True: b',"cached":true}', False: b',"cached":false}'}
+
+
+def _encoded_response(request, variants, content_type):
+    """Response with the cached variant in the client's preferred content coding"""
+    encoding = accepted_encoding(request)
+    if encoding not in variants:
+        encoding = None
+    response = HttpResponse(variants[encoding], content_type=content_type)
+    set_content_encoding(response, encoding)
+    return response
+
+
+def _page_response(request, variants, fresh=None):
+    """
+    Search page response in the client's preferred content coding: a cache
+    hit, or the fresh (body, encoding) of the request that computed the page
+    """
+    if fresh is None:
+        return _encoded_response(request, variants, 'application/json')
+    body, encoding = fresh
+    response = HttpResponse(body, content_type='application/json')
+    set_content_encoding(response, encoding)
+    return response
+
+
+def _last_modified_key(generation):
+    return search_cache_key(generation, 'last_modified', read_database())
+
+
+def _data_last_modified(generation):
+    """
+    Time of the latest restaurant save, delete or search column rebuild
+    (None if none), cached per generation
+    """
+    key = _last_modified_key(generation)
+    last_modified = search_cache.get(key)
+    if last_modified is None:
+        times = [
+            Restaurant.objects.aggregate(time=Max('updated_at'))['time'],
+            RestaurantTombstone.objects.aggregate(time=Max('deleted_at'))['time'],
+            get_watermark(FULL_REINDEX),
+        ]
+        # 0 caches "no data" too
+        last_modified = max((time for time in times if time), default=0)
+        search_cache.set(key, last_modified, timeout=settings.SEARCH_CACHE_TIMEOUT)
+    return last_modified or None
+
+
+def _detail_page(restaurant, request):
+    """
+    Cache entry of a restaurant's rendered detail page: its HTML in every
+    content coding, and the updated_at it was rendered from
+    """
+    # The page only depends on the restaurant (no user, session or CSRF
+    # token), so one rendering serves every client
+    html = render_to_string('basicSearch/restaurant_detail.html', {'restaurant': restaurant}, request)
+    return {'updated_at': restaurant.updated_at, 'variants': encoded_variants(html.encode())}
+
+
+def _cached_detail_page(request, entry, updated_at):
+    """Response from a cached detail page, None if it is missing or outdated"""
+    if entry is None or entry['updated_at'] != updated_at:
+        return None
+    return _encoded_response(request, entry['variants'], 'text/html; charset=utf-8')
+
+
+def _parse_batch(params):
+    """
+    Validate a batch lookup: returns the requested ids (UUIDs, deduplicated,
+    in request order) and fields, or raises ValueError
+    """
+    values = [value.strip() for param in params.getlist('ids') for value in param.split(',') if value.strip()]
+    try:
+        ids = list(dict.fromkeys(uuid.UUID(value) for value in values))
+    except ValueError:
+        raise ValueError('Invalid ids')
+    if not ids:
+        raise ValueError('No ids')
+    if len(ids) > settings.RESTAURANT_BATCH_MAX_IDS:
+        raise ValueError(f'At most {settings.RESTAURANT_BATCH_MAX_IDS} ids per request')
+    
+    requested = set(_parse_list(params, 'fields')) or set(DEFAULT_RESTAURANT_FIELDS)
+    if not requested <= set(RESTAURANT_FIELDS):
+        raise ValueError('Invalid fields')
+    # The id is always returned, so results can be matched to the request
+    fields = [field for field in RESTAURANT_FIELDS if field == 'id' or field in requested]
+    return ids, fields
+
+
+def _batch_keys(ids):
+    """Cache key of each id's batch lookup entry, for the running view's database"""
+    using = read_database()
+    return {restaurant_cache_key(restaurant_id, using): restaurant_id for restaurant_id in ids}
+
+
+def _batch_versions(ids):
+    """(id, updated_at) of the restaurants with the given ids, to validate cached entries"""
+    return restrict_to_ids(Restaurant.objects.order_by(), [restaurant_id.hex for restaurant_id in ids]).values_list(
+        'id', 'updated_at',
+    )
+
+
+def _current_entries(keys, entries, versions):
+    """
+    Restaurants of the cached entries whose updated_at is the row's current
+    one, and the ids of the existing restaurants left to query
+    """
+    restaurants = {}
+    for key, entry in entries.items():
+        restaurant_id = keys[key]
+        if entry['updated_at'] == versions.get(restaurant_id):
+            restaurants[restaurant_id] = entry['restaurant']
+    return restaurants, [restaurant_id for restaurant_id in versions if restaurant_id not in restaurants]
+
+
+def _batch_entry(row):
+    """Cached batch lookup entry of a _batch_rows row"""
+    return {'updated_at': row['updated_at'], 'restaurant': serialize_restaurant(row)}
+
+
+def _batch_rows(ids):
+    """Rows of the restaurants with the given ids, one query for all of them"""
+    # Every field is read, so the cached entry serves any later projection;
+    # results are put in request order afterwards, so no ORDER BY
+    restaurants = restrict_to_ids(Restaurant.objects.order_by(), [restaurant_id.hex for restaurant_id in ids])
+    return restaurants.values(*RESTAURANT_COLUMNS)
+
+
+def _batch_response(ids, fields, restaurants):
+    """Batch lookup response: the fields of the found restaurants, in request order"""
+    data = {
+        'success': True,
+        'results': [
+            {field: restaurants[restaurant_id][field] for field in fields}
+            for restaurant_id in ids if restaurant_id in restaurants
+        ],
+        'missing': [str(restaurant_id) for restaurant_id in ids if restaurant_id not in restaurants],
+    }
+    return HttpResponse(dumps(data), content_type='application/json')
 
 
 def index(request):
     """Main search page view"""
     return render(request, 'basicSearch/index.html')
 
+@compress_page
+@reads_search_database
 def restaurant_detail(request, restaurant_id):
     """Detailed view for a specific restaurant"""
-    restaurant = get_object_or_404(Restaurant, id=restaurant_id)
-    return render(request, 'basicSearch/restaurant_detail.html', {'restaurant': restaurant})
+    # Only the timestamp is read to validate the client's copy
+    updated_at = Restaurant.objects.filter(id=restaurant_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise Http404('No Restaurant matches the given query.')
+    
+    def render_page():
+        key = detail_cache_key(restaurant_id)
+        response = _cached_detail_page(request, search_cache.get(key), updated_at)
+        if response is None:
+            entry = _detail_page(get_object_or_404(Restaurant, id=restaurant_id), request)
+            search_cache.set(key, entry, timeout=settings.DETAIL_CACHE_TIMEOUT)
+            response = _cached_detail_page(request, entry, entry['updated_at'])
+        return response
+    
+    etag = f'{restaurant_id.hex}-{updated_at.timestamp():.6f}'
+    return conditional_response(request, 'detail', etag, updated_at, render_page)
+
+@reads_search_database
+def restaurant_batch(request):
+    """API endpoint returning many restaurants by id, cached per restaurant"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    try:
+        ids, fields = _parse_batch(request.GET)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    
+    keys = _batch_keys(ids)
+    # Only the timestamps are read to validate the cached entries; deleted
+    # restaurants have none, so their entries are never served
+    versions = dict(_batch_versions(ids))
+    restaurants, stale = _current_entries(keys, cache.get_many(keys), versions)
+    if stale:
+        # Only the ids the cache did not have current are queried
+        entries = {row['id']: _batch_entry(row) for row in _batch_rows(stale)}
+        cache.set_many(
+            {key: entries[restaurant_id] for key, restaurant_id in keys.items() if restaurant_id in entries},
+            timeout=settings.RESTAURANT_CACHE_TIMEOUT,
+        )
+        restaurants.update((restaurant_id, entry['restaurant']) for restaurant_id, entry in entries.items())
+    return _batch_response(ids, fields, restaurants)
 
 @csrf_exempt
+@compress_page
+@reads_search_database
 def search_restaurants(request):
     """AJAX API endpoint for restaurant search with caching"""
     if request.method == 'GET':
-        query = request.GET.get('q', '')
-        
-        # Generate cache key for this search query
-        cache_key = f"{settings.CACHE_KEY_PREFIX}:{query.lower().strip()}"
+        try:
+            query, cursor, limit, filters, output_format = _parse_search(request.GET)
+        except ValueError as error:
+            return JsonResponse({'success': False, 'error': str(error)}, status=400)
         
-        # Try to get cached results first
-        cached_results = cache.get(cache_key)
-        if cached_results is not None:
-            return JsonResponse({
-                'success': True,
-                'results': cached_results['results'],
-                'count': cached_results['count'],
-                'cached': True
-            })
+        # Full result set export, not paginated nor cached
+        if output_format == 'ndjson':
+            try:
+                return _export_results(query, filters, cursor, get_generation())
+            except InvalidCursor:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
         
-        # Start with all restaurants
-        restaurants = Restaurant.objects.all()
+        # Generate cache key for the encoded response to this page of the search query
+        generation = get_generation()
+        # The database is part of the key: a client reading the primary after
+        # a write must not get pages built from the search copy
+        cache_key = search_cache_key(
+            generation, 'body', read_database(), query.lower().strip(), filters, limit, cursor,
+        )
         
-        # Apply search filter if query provided
-        if query:
-            restaurants = restaurants.filter(
-                Q(name__icontains=query) |
-                Q(cuisine__icontains=query) |
-                Q(address__icontains=query) |
-                Q(neighbourhood__icontains=query)
-                # Removed vibes search as it's not supported by SQLite
-            )
+        def render_page():
+            fresh = []
+            
+            def compute():
+                variants, body = _encode_page(
+                    _search_page(query, filters, limit, cursor, generation), accepted_encoding(request),
+                )
+                fresh.append(body)
+                return variants
+            
+            # Serve from cache; on a miss only one worker runs the query
+            try:
+                variants, cached = search_cache.get_or_compute(
+                    cache_key, compute, timeout=settings.SEARCH_CACHE_TIMEOUT,
+                )
+            except InvalidCursor:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+            return _page_response(request, variants, None if cached else fresh[0])
         
-        # Convert to JSON-serializable format for search results
-        results = []
-        for restaurant in restaurants:
-            results.append({
-                'id': str(restaurant.id),
-                'name': restaurant.name,
-                'cuisine': restaurant.cuisine or '',
-                'address': restaurant.address,
-                'neighbourhood': restaurant.neighbourhood or '',
-                'rating': float(restaurant.rating) if restaurant.rating else 0.0,
-                'price_range': restaurant.price_range or '',
-                'vibes': [vibe.lower() for vibe in restaurant.get_vibes_display()[:3]],  # Show first 3 vibes in lowercase
-                'reservation_partner': restaurant.reservation_partner,
-                'main_image': restaurant.images[0] if restaurant.images else None,
-            })
-        
-        # Cache the results for 5 minutes
-        cache_data = {
-            'results': results,
-            'count': len(results)
-        }
-        cache.set(cache_key, cache_data, timeout=300)  # 5 minutes cache
-        
-        return JsonResponse({
-            'success': True,
-            'results': results,
-            'count': len(results),
-            'cached': False
-        })
+        # The cache key covers the generation and the normalized parameters,
+        # so it changes exactly when the response would
+        etag = hashlib.sha1(cache_key.encode()).hexdigest()
+        return conditional_response(request, 'search', etag, _data_last_modified(generation), render_page)
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 def clear_search_cache(request):
     """Clear all search cache entries"""
     try:
-        # Get all cache keys that start with our prefix
-        cache_keys = []
-        for key in cache._cache.keys():
-            if key.startswith(settings.CACHE_KEY_PREFIX):
-                cache_keys.append(key)
-        
-        # Clear all search-related cache entries
-        cache.delete_many(cache_keys)
+        # Moving to a new generation orphans every cached search at once,
+        # the old entries simply expire
+        generation = bump_generation()
         
         return JsonResponse({
             'success': True,
-            'message': f'Cleared {len(cache_keys)} cache entries',
-            'cleared_keys': cache_keys
+            'message': f'Search cache invalidated (generation {generation})',
+            'generation': generation
         })
     except Exception as e:
         return JsonResponse({
@@ -106,13 +546,9 @@ def clear_search_cache(request):
 def get_cache_stats(request):
     """Get cache statistics"""
     try:
-        # Get cache info (this is a simple implementation)
-        cache_info = {
-            'backend': 'LocMemCache',
-            'timeout': 300,
-            'max_entries': 1000,
-            'current_entries': len(cache._cache) if hasattr(cache, '_cache') else 'Unknown'
-        }
+        # Describe the configured (possibly shared) cache tier
+        cache_info = describe_cache()
+        cache_info['typeahead'] = typeahead.stats
         
         return JsonResponse({
             'success': True,
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mainSearch.settings')
+# Persistent connections belong to the thread that opened them, and ASGI
+# requests do not come back to the same one, so each would only leave an idle
+# connection behind
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,11 @@
+"""
+URL configuration for requests served under ASGI (mainSearch.asgi), routing
+to the async views. Selected per request by AsgiUrlconfMiddleware.
+"""
+from django.contrib import admin
+from django.urls import include, path
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path("", include("basicSearch.async_urls")),
+]
@@ -0,0 +1,35 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+class AsgiUrlconfMiddleware:
+    """
+    Route requests served under ASGI through settings.ASGI_ROOT_URLCONF, so
+    they reach the async views natively. WSGI requests keep ROOT_URLCONF and
+    the sync views, which run there without an event loop per request.
+
+    Written without MiddlewareMixin, which would run process_request() in a
+    thread on every ASGI request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._route(request)
+        return await self.get_response(request)
+
+    def _route(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.ASGI_ROOT_URLCONF
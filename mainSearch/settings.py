@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Before any middleware reading or changing the response body. The
+    # search and detail views compress their own responses (compress_page),
+    # which this leaves alone.
+    'django.middleware.gzip.GZipMiddleware',
+    'mainSearch.middleware.AsgiUrlconfMiddleware',
+    'basicSearch.routers.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +59,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'mainSearch.urls'
 
+# URLconf of requests served by mainSearch.asgi (async views)
+ASGI_ROOT_URLCONF = 'mainSearch.asgi_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -74,13 +84,65 @@ WSGI_APPLICATION = 'mainSearch.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Applied to every new SQLite connection of the 'production' profile
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',           # readers never wait for a writer, nor a writer for readers
+    'synchronous': 'NORMAL',         # fsync at checkpoints only; durable enough with WAL
+    'mmap_size': 256 * 1024 * 1024,  # read pages straight from the OS page cache
+    'cache_size': -64 * 1024,        # 64 MB page cache per connection (negative: KiB)
+    'temp_store': 'MEMORY',          # sorts and temporary B-trees stay in memory
+}
+
+# DATABASE_PROFILE (environment) selects how the database is used:
+#   'production' - SQLITE_PRAGMAS and persistent connections (DATABASE_CONN_MAX_AGE
+#                  seconds, checked before reuse) (default). Transactions stay
+#                  DEFERRED, so read-only ones never take the write lock; the
+#                  read-then-write ones use basicSearch.transactions.write_transaction.
+#                  Under ASGI, mainSearch/asgi.py makes DATABASE_CONN_MAX_AGE
+#                  default to 0: connections are not reused across requests there.
+#   'default'    - Django's defaults: a connection per request, rollback journal
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'production')
+
+DATABASE_PROFILES = {
+    'default': {},
+    'production': {
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'DEFERRED',
+            'timeout': 20,  # seconds a writer waits for the write lock
+        },
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
 
+# SEARCH_DATABASE (environment): path of a read-only copy of the database,
+# written by the snapshot_search_database command or kept by an external
+# SQLite replication tool. search_restaurants and restaurant_detail read from
+# it while writes (admin, ingest) go to 'default', so they never share a file
+# lock with search traffic. Empty: everything uses 'default'.
+SEARCH_DATABASE = os.environ.get('SEARCH_DATABASE', '')
+if SEARCH_DATABASE:
+    DATABASES['search'] = {
+        **DATABASES['default'],
+        'NAME': SEARCH_DATABASE,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['basicSearch.routers.SearchRouter']
+
+# Seconds a client that wrote restaurants reads the primary instead of the
+# search copy; keep above the snapshot interval (or replication lag)
+SEARCH_DATABASE_STICKY_SECONDS = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,16 +186,123 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cache Configuration
-CACHES = {
-    'default': {
+# CACHE_BACKEND (environment) selects the cache used by the search API:
+#   'sqlite'    - SQLite file shared by every worker process on the host (default)
+#   'locmem'    - per-process memory, not shared between workers
+#   'redis'     - Redis server at CACHE_LOCATION, e.g. redis://127.0.0.1:6379/1
+#   'memcached' - memcached server(s) at CACHE_LOCATION, e.g. 127.0.0.1:11211
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'basicSearch.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': CACHE_MAX_ENTRIES,  # Maximum number of cache entries
+        }
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # 5 minutes cache timeout
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,  # Maximum number of cache entries
+            'MAX_ENTRIES': CACHE_MAX_ENTRIES,  # Maximum number of cache entries
         }
-    }
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211').split(','),
+    },
+}
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': 300,  # 5 minutes cache timeout
+    },
 }
 
 # Cache key prefix for search results
 CACHE_KEY_PREFIX = 'search_results'
+
+# Seconds a cached search page stays fresh
+SEARCH_CACHE_TIMEOUT = 300
+
+# Seconds a rendered restaurant detail page stays cached. Entries are
+# checked against the restaurant's updated_at and dropped when it is saved.
+DETAIL_CACHE_TIMEOUT = 24 * 3600
+
+# Batch lookup API (/restaurants/): ids accepted per request, and seconds a
+# restaurant's entry stays cached (entries are checked against the
+# restaurant's updated_at and dropped when it is saved)
+RESTAURANT_BATCH_MAX_IDS = 100
+RESTAURANT_CACHE_TIMEOUT = 3600
+
+# Stampede protection: once a cached search expires, a single worker
+# recomputes it (holding a lock for at most SEARCH_LOCK_TIMEOUT seconds)
+# while the others serve the stale page for up to SEARCH_STALE_GRACE seconds.
+# Requests with nothing stale to serve wait up to SEARCH_LOCK_WAIT seconds.
+# SEARCH_EARLY_REFRESH_BETA > 0 enables probabilistic early refresh (0 disables).
+SEARCH_STALE_GRACE = 60
+SEARCH_LOCK_TIMEOUT = 10
+SEARCH_LOCK_WAIT = 2.0
+SEARCH_EARLY_REFRESH_BETA = 1.0
+
+# Incremental sync of the in-memory search index: rows changed up to
+# SEARCH_SYNC_OVERLAP seconds before the last sync are read again (covers
+# transactions that committed after stamping updated_at). Tombstones of
+# deleted restaurants are kept SEARCH_TOMBSTONE_RETENTION seconds; an index
+# older than that is rebuilt in full.
+SEARCH_SYNC_OVERLAP = 60
+SEARCH_TOMBSTONE_RETENTION = 7 * 24 * 3600
+
+# Cache-Control directives per endpoint, as django.utils.cache.patch_cache_control
+# keywords. Responses carry ETag/Last-Modified validators, so revalidating
+# (a 304 without running the query) is cheap once max_age has passed.
+HTTP_CACHE_CONTROL = {
+    'search': {'public': True, 'max_age': 0, 'stale_while_revalidate': 30},
+    'detail': {'public': True, 'max_age': 60, 'stale_while_revalidate': 300},
+}
+
+# Compression of the search and detail responses (brotli when installed,
+# else gzip). Cached pages are stored compressed, so these levels are paid
+# once per page.
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Rows fetched from the database at a time by the NDJSON export (format=ndjson)
+SEARCH_EXPORT_CHUNK_SIZE = 2000
+
+# Largest radius (km) accepted by location searches
+SEARCH_GEO_MAX_RADIUS_KM = 50
+
+# Typeahead: a query whose complete result set has at most this many rows
+# is cached as a whole, and longer queries extending it are answered by
+# filtering that set in memory instead of querying the database
+SEARCH_TYPEAHEAD_MAX_RESULTS = 200
+# Cached prefixes looked up per query: the query itself and its longest
+# prefixes, typically the previous keystrokes
+SEARCH_TYPEAHEAD_MAX_PREFIXES = 8
+
+# Per-process (L1) search result cache in front of CACHES['default'] (L2)
+SEARCH_L1_MAX_BYTES = 16 * 1024 * 1024
+SEARCH_L1_TIMEOUT = 60
+
+# Seconds a process trusts its copy of the search cache generation, i.e.
+# how long an invalidation made by another process may take to be seen
+SEARCH_GENERATION_TTL = 1.0
+
+# Free text search backend used by the search API:
+#   'index' - in-memory inverted index kept in sync through model signals
+#   'fts'   - SQLite FTS5 table kept in sync by triggers, ordered by bm25 relevance
+#   'orm'   - substring match on the search_document column, evaluated by the database
+SEARCH_BACKEND = 'index'
+
+# Search API page sizes (the client can ask for up to SEARCH_MAX_PAGE_SIZE rows)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100